@@ -0,0 +1,833 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+import multiprocessing
+import numpy as np
+import coordinate_transforms
+import ekf
+import error_ellipse
+import foa
+import geometry_cache
+import grid_search
+import ils
+import jacobians
+import model_equations
+import parallel
+import pipeline
+import precision
+import unit_converter
+
+
+def benchmark(func, *args, repeat=5, **kwargs):
+    """Best wall time in seconds of func(*args, **kwargs) over repeat runs"""
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def random_ecef_points(n, seed=0):
+    """n ECEF points spread over the globe from the surface up to GEO altitude"""
+    rng = np.random.default_rng(seed)
+    latitude = rng.uniform(-90, 90, n)
+    longitude = rng.uniform(-180, 180, n)
+    altitude = rng.uniform(-1e3, 4e7, n)
+    return coordinate_transforms.geodetic_to_ecef(latitude, longitude, altitude).T
+
+
+def benchmark_ecef_to_geodetic(n=10_000, seed=0):
+    """Compare the scalar iterative ecef_to_geodetic loop with ecef_to_geodetic_array"""
+    points = random_ecef_points(n, seed)
+
+    def scalar_path():
+        return np.array([coordinate_transforms.ecef_to_geodetic(*p) for p in points])
+
+    reference = scalar_path()
+    vectorized = coordinate_transforms.ecef_to_geodetic_array(points)
+    return {
+        "n": n,
+        "scalar_s": benchmark(scalar_path, repeat=1),
+        "vectorized_s": benchmark(
+            coordinate_transforms.ecef_to_geodetic_array, points
+        ),
+        "max_abs_alt_error_m": float(np.abs(vectorized[:, 2] - reference[:, 2]).max()),
+        "max_abs_lat_error_deg": float(
+            np.abs(vectorized[:, 0] - reference[:, 0]).max()
+        ),
+    }
+
+
+def range_rate_pass(n, sigma=0.05, seed=0):
+    """200 m/s, 20 km radius orbit at 9 km altitude around a ground emitter sampled at 10 Hz
+
+    Returns the true emitter ECEF position, (n, 3) sensor positions and velocities and n
+    noisy range rate measurements.
+    """
+    rng = np.random.default_rng(seed)
+    emitter = coordinate_transforms.geodetic_to_ecef(35.0, -77.0, 0.0)
+    site = coordinate_transforms.LocalFrame(35.1, -77.1, 0.0)
+    radius, speed = 20_000.0, 200.0
+    heading = np.arange(n) * 0.1 * speed / radius
+    position_enu = np.column_stack(
+        [radius * np.cos(heading), radius * np.sin(heading), np.full(n, 9_000.0)]
+    )
+    velocity_enu = speed * np.column_stack(
+        [-np.sin(heading), np.cos(heading), np.zeros(n)]
+    )
+    sat_position = site.to_ecef(position_enu)
+    sat_velocity = velocity_enu @ site.R
+    measurements = model_equations.model_equation_rr(
+        emitter, sat_position, sat_velocity
+    ) + rng.normal(0, sigma, n)
+    return emitter, sat_position, sat_velocity, measurements
+
+
+def benchmark_streaming_ekf(n=20_000, batch_sizes=(1, 8, 32, 64), seed=0):
+    """Range rate updates per second of ExtendedKalmanFilter.stream per micro-batch size"""
+    emitter, sat_position, sat_velocity, measurements = range_rate_pass(n, seed=seed)
+    results = {"n": n}
+    for m in batch_sizes:
+        f = ekf.ExtendedKalmanFilter(
+            initial_parameters=emitter + np.array([2e3, -2e3, 0.0]),
+            initial_covariance=np.eye(3) * 1e7,
+            measurement=None,
+            sensor_noise=np.array([0.05]),
+            confidence=0.95,
+            model=model_equations.model_equation_rr,
+            linearized_model=jacobians.range_rate_jacobian,
+        )
+        feed = (
+            (
+                measurements[i : i + m],
+                None,
+                sat_position[i : i + m],
+                sat_velocity[i : i + m],
+            )
+            for i in range(0, n, m)
+        )
+        start = time.perf_counter()
+        for x_estimate, P in f.stream(feed):
+            pass
+        results[f"updates_per_s_batch_{m}"] = n / (time.perf_counter() - start)
+        results[f"error_m_batch_{m}"] = float(np.linalg.norm(x_estimate - emitter))
+    return results
+
+
+def benchmark_ekf_bank(n_filters=300, n_ticks=50, m=4, seed=0):
+    """Per tick cost of ExtendedKalmanFilterBank against a loop of ExtendedKalmanFilters"""
+    emitter, sat_position, sat_velocity, measurements = range_rate_pass(
+        n_ticks * m, seed=seed
+    )
+    rng = np.random.default_rng(seed)
+    initial_parameters = emitter + rng.normal(0, 500, (n_filters, 3))
+    common = dict(
+        sensor_noise=np.array([0.05]),
+        confidence=0.95,
+        model=model_equations.model_equation_rr,
+        linearized_model=jacobians.range_rate_jacobian,
+    )
+    bank = ekf.ExtendedKalmanFilterBank(n_parameters=3, **common)
+    filters = []
+    for x in initial_parameters:
+        bank.add(x, np.eye(3) * 1e6)
+        filters.append(
+            ekf.ExtendedKalmanFilter(
+                x.copy(), np.eye(3) * 1e6, measurement=None, **common
+            )
+        )
+    ticks = [slice(i * m, (i + 1) * m) for i in range(n_ticks)]
+
+    def bank_path():
+        for tick in ticks:
+            bank.update(
+                None,
+                np.broadcast_to(measurements[tick], (n_filters, m)),
+                None,
+                np.broadcast_to(sat_position[tick], (n_filters, m, 3)),
+                np.broadcast_to(sat_velocity[tick], (n_filters, m, 3)),
+            )
+
+    def loop_path():
+        for tick in ticks:
+            for f in filters:
+                f.update(measurements[tick], None, sat_position[tick], sat_velocity[tick])
+
+    return {
+        "n_filters": n_filters,
+        "bank_s_per_tick": benchmark(bank_path, repeat=1) / n_ticks,
+        "loop_s_per_tick": benchmark(loop_path, repeat=1) / n_ticks,
+    }
+
+
+def benchmark_parallel_ils(n_tasks=2_000, window=500, worker_counts=None, seed=0):
+    """Fits per second of solve_ils_parallel for each worker count and speedup over 1 worker
+
+    Every task fits one window of a shared range rate orbit, so the work per task is equal
+    and the speedup reflects the driver's scaling rather than load imbalance.
+    """
+    if worker_counts is None:
+        cores = multiprocessing.cpu_count()
+        worker_counts = sorted({1, *[2**k for k in range(6) if 2**k <= cores], cores})
+    n_samples = 20_000
+    emitter, sat_position, sat_velocity, measurements = range_rate_pass(
+        n_samples, seed=seed
+    )
+    starts = (np.arange(n_tasks) * 97) % (n_samples - window)
+    windows = np.column_stack([starts, starts + window])
+    initial_parameters = np.tile(emitter + np.array([300.0, -200.0, 0.0]), (n_tasks, 1))
+    results = {"n_tasks": n_tasks, "window": window}
+    reference = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        solved = parallel.solve_ils_parallel(
+            initial_parameters,
+            measurements,
+            windows,
+            (sat_position, sat_velocity),
+            measurement_noise=np.array([0.05]),
+            tol=1e-3,
+            max_iterations=50,
+            model=model_equations.model_equation_rr,
+            linearized_model=jacobians.range_rate_jacobian,
+            workers=workers,
+        )
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference, serial = solved, elapsed
+        results[f"fits_per_s_{workers}_workers"] = n_tasks / elapsed
+        results[f"speedup_{workers}_workers"] = serial / elapsed
+        results[f"identical_{workers}_workers"] = bool(np.array_equal(solved, reference))
+    return results
+
+
+def benchmark_ils_methods(n_starts=50, n=600, max_iterations=50, seed=0):
+    """Gauss-Newton against Levenberg-Marquardt on a short straight range rate pass
+
+    A straight line pass leaves the emitter nearly unobservable across track, which makes
+    Gauss-Newton oscillate. Reports mean iterations, convergence rate and the fraction of
+    starts which used the whole iteration budget for each method.
+    """
+    rng = np.random.default_rng(seed)
+    emitter = coordinate_transforms.geodetic_to_ecef(35.0, -77.0, 0.0)
+    site = coordinate_transforms.LocalFrame(34.9, -77.2, 0.0)
+    t = np.arange(n) * 0.1
+    velocity_enu = np.array([200.0, 20.0, 0.0])
+    sat_position = site.to_ecef(
+        np.column_stack([t * velocity_enu[0], t * velocity_enu[1], np.full(n, 9_000.0)])
+    )
+    sat_velocity = np.broadcast_to(velocity_enu @ site.R, (n, 3))
+    measurements = model_equations.model_equation_rr(
+        emitter, sat_position, sat_velocity
+    ) + rng.normal(0, 0.05, n)
+    starts = emitter + rng.normal(0, 5e3, (n_starts, 3))
+    results = {"n_starts": n_starts}
+    for method in ("gauss-newton", "levenberg-marquardt"):
+        solved = [
+            ils.IteratedLeastSquares(
+                initial_parameters=x[:, np.newaxis],
+                measurements=measurements[:, np.newaxis],
+                measurement_noise=np.array([0.05]),
+                tol=1e-3,
+                max_iterations=max_iterations,
+                model=model_equations.model_equation_rr,
+                linearized_model=jacobians.range_rate_jacobian,
+                method=method,
+                verbose=False,
+            ).solve_ils(sat_position, sat_velocity)
+            for x in starts
+        ]
+        iterations = np.array([r.iterations for r in solved])
+        results[f"{method}_mean_iterations"] = float(iterations.mean())
+        results[f"{method}_converged"] = float(np.mean([r.converged for r in solved]))
+        results[f"{method}_full_budget"] = float(np.mean(iterations == max_iterations))
+    return results
+
+
+def benchmark_error_ellipses(n=100_000, n_loop=2_000, seed=0):
+    """Batched closed form error_ellipses against per covariance plot_error_ellipse calls"""
+    rng = np.random.default_rng(seed)
+    A = rng.normal(size=(n, 2, 2))
+    P = A @ np.swapaxes(A, 1, 2) + 0.01 * np.eye(2)
+    error_ellipse.error_ellipses(P[:1])  # first call pays the scipy.stats import
+
+    def loop_path():
+        for covariance in P[:n_loop]:
+            error_ellipse.plot_error_ellipse(covariance)
+
+    return {
+        "n": n,
+        "batched_s": benchmark(error_ellipse.error_ellipses, P),
+        "batched_with_points_s": benchmark(error_ellipse.error_ellipses, P, n_points=32),
+        "loop_s_extrapolated": benchmark(loop_path, repeat=1) * n / n_loop,
+    }
+
+
+def benchmark_foa(n=10_000, seed=0):
+    """FrequencyOfArrival.solve against IteratedLeastSquares chaining model_equation_foa and jacobian_foa"""
+    emitter, sat_position, sat_velocity, _ = range_rate_pass(n, seed=seed)
+    rng = np.random.default_rng(seed)
+    engine = foa.FrequencyOfArrival(sat_position, sat_velocity)
+    measurements = engine.model(np.append(emitter, 9.4e9)) + rng.normal(0, 1.0, n)
+    initial_parameters = np.append(emitter + np.array([2e3, -1e3, 0.0]), 9.4e9 + 50)
+
+    def chained_path():
+        return ils.IteratedLeastSquares(
+            initial_parameters=initial_parameters[:, np.newaxis],
+            measurements=measurements[:, np.newaxis],
+            measurement_noise=np.array([1.0]),
+            tol=1e-3,
+            max_iterations=50,
+            model=model_equations.model_equation_foa,
+            linearized_model=jacobians.jacobian_foa,
+            verbose=False,
+        ).solve_ils(sat_position, sat_velocity)
+
+    def fused_path():
+        return engine.solve(
+            initial_parameters[:3],
+            measurements,
+            measurement_noise=np.array([1.0]),
+            tol=1e-3,
+            max_iterations=50,
+            initial_frequencies=initial_parameters[3:],
+            verbose=False,
+        )
+
+    chained, fused = chained_path(), fused_path()
+    return {
+        "n": n,
+        "chained_s": benchmark(chained_path),
+        "fused_s": benchmark(fused_path),
+        "iterations": (chained.iterations, fused.iterations),
+        "max_abs_difference": float(np.abs(chained.x_estimate - fused.x_estimate).max()),
+    }
+
+
+def benchmark_sliding_window(window_sizes=(1_000, 10_000, 50_000), step=50, n_steps=100, seed=0):
+    """SlidingWindowLeastSquares.update against a warm started IteratedLeastSquares re-solve
+
+    Both fit the newest window_size samples of a range rate pass after each step of new
+    samples, the incremental update should cost the same for every window size.
+    """
+    results = {"step": step}
+    for window_size in window_sizes:
+        n = window_size + step * n_steps
+        emitter, sat_position, sat_velocity, measurements = range_rate_pass(n, seed=seed)
+        x_naught = (emitter + np.array([2e3, -1e3, 0.0]))[:, np.newaxis]
+        window = ils.SlidingWindowLeastSquares(
+            initial_parameters=x_naught,
+            window_size=window_size,
+            measurement_noise=np.array([0.05]),
+            tol=1.0,
+            max_iterations=10,
+            model=model_equations.model_equation_rr,
+            linearized_model=jacobians.range_rate_jacobian,
+        )
+        rows = slice(0, window_size)
+        window.update(measurements[rows], sat_position[rows], sat_velocity[rows])
+
+        def sliding_path():
+            for first in range(window_size, n, step):
+                rows = slice(first, first + step)
+                x_estimate, _ = window.update(
+                    measurements[rows], sat_position[rows], sat_velocity[rows]
+                )
+            return x_estimate
+
+        def resolve_path():
+            x_estimate = x_naught
+            for first in range(window_size + step, n + 1, step):
+                rows = slice(first - window_size, first)
+                x_estimate, _ = ils.IteratedLeastSquares(
+                    initial_parameters=x_estimate,
+                    measurements=measurements[rows, np.newaxis],
+                    measurement_noise=np.array([0.05]),
+                    tol=1.0,
+                    max_iterations=10,
+                    model=model_equations.model_equation_rr,
+                    linearized_model=jacobians.range_rate_jacobian,
+                    verbose=False,
+                ).solve_ils(sat_position[rows], sat_velocity[rows])
+            return x_estimate
+
+        sliding_s = benchmark(sliding_path, repeat=1) / n_steps
+        resolve_s = benchmark(resolve_path, repeat=1) / n_steps
+        results[f"window_{window_size}"] = {
+            "sliding_update_s": sliding_s,
+            "resolve_s": resolve_s,
+            "speedup": resolve_s / sliding_s,
+        }
+    return results
+
+
+def benchmark_geometry_cache(n=100_000, n_hypotheses=64, seed=0):
+    """Cached sensor geometry against recomputing it for every call
+
+    Scores a batch of emitter hypotheses against one range rate pass with and without a
+    track_id naming the pass.
+    """
+    emitter, sat_position, sat_velocity, _ = range_rate_pass(n, seed=seed)
+    rng = np.random.default_rng(seed)
+    hypotheses = emitter + rng.normal(0, 5e3, (n_hypotheses, 3))
+    cache = geometry_cache.DEFAULT_CACHE
+    cache.evict("benchmark_pass")
+    direct_s = benchmark(
+        model_equations.model_equation_rr, hypotheses, sat_position, sat_velocity
+    )
+    cached_s = benchmark(
+        model_equations.model_equation_rr,
+        hypotheses,
+        sat_position,
+        sat_velocity,
+        track_id="benchmark_pass",
+    )
+    return {
+        "n": n,
+        "n_hypotheses": n_hypotheses,
+        "model_equation_rr_s": direct_s,
+        "model_equation_rr_track_s": cached_s,
+        "cache": cache.stats(),
+    }
+
+
+def benchmark_pipeline(rate=50_000, n=200_000, n_sources=2, chunk_size=64, seed=0):
+    """IngestionPipeline latency with simulated sensors delivering rate rows per second
+
+    The pass is split round robin across n_sources paced simulated sources, every row
+    reaches the filter through the ingest, align, batch and executor update stages.
+    """
+    emitter, sat_position, sat_velocity, measurements = range_rate_pass(n, seed=seed)
+    time_tags = np.arange(n) / rate
+    kalman = ekf.ExtendedKalmanFilter(
+        initial_parameters=emitter + np.array([300.0, -200.0, 0.0]),
+        initial_covariance=np.eye(3) * 1e6,
+        measurement=None,
+        sensor_noise=np.array([0.05]),
+        confidence=0.95,
+        model=model_equations.model_equation_rr,
+        linearized_model=jacobians.range_rate_jacobian,
+    )
+    sources = [
+        pipeline.simulated_source(
+            time_tags[i::n_sources],
+            measurements[i::n_sources],
+            0.05,
+            sat_position[i::n_sources],
+            sat_velocity[i::n_sources],
+            chunk_size=chunk_size,
+            rate=rate / n_sources,
+        )
+        for i in range(n_sources)
+    ]
+    start = time.perf_counter()
+    stats = asyncio.run(pipeline.IngestionPipeline(kalman, sources).run())
+    stats["rows_per_s"] = n / (time.perf_counter() - start)
+    stats["position_error_m"] = float(np.linalg.norm(kalman.initial_parameters - emitter))
+    return stats
+
+
+def benchmark_precision(n=100_000, n_candidates=4_096, seed=0):
+    """float32 evaluation about a local origin against the float64 path
+
+    Times grid scoring (RangeRateGeometry) and a Gauss-Newton fit with
+    model_and_jacobian_rr, with their peak traced allocation and their difference from
+    float64. "float32_ecef" repeats the fit with the origin at the centre of the earth,
+    i.e. float32 without recentring.
+    """
+    emitter, sat_position, sat_velocity, measurements = range_rate_pass(n, seed=seed)
+    x_naught = emitter + np.array([300.0, -200.0, 0.0])
+    rng = np.random.default_rng(seed)
+    candidates = emitter + rng.normal(0, 5e3, (n_candidates, 3))
+    geometries = {
+        "float64": grid_search.RangeRateGeometry(sat_position, sat_velocity),
+        "float32": grid_search.RangeRateGeometry(
+            sat_position, sat_velocity, origin=x_naught, dtype=np.float32
+        ),
+    }
+    results = {"n": n, "n_candidates": n_candidates}
+    costs = {}
+    for name, geometry in geometries.items():
+        search = grid_search.GridSearch(geometry, measurements, np.array([0.05]))
+        seconds, peak_bytes, costs[name] = measure(lambda: search.score(candidates))
+        results[f"grid_score_{name}"] = {
+            "seconds": seconds,
+            "candidates_per_s": n_candidates / seconds,
+            "peak_mib": peak_bytes / 2**20,
+            "geometry_mib": (geometry.sat_position.nbytes + geometry.sat_velocity.nbytes)
+            / 2**20,
+        }
+    results["grid_score_float32"]["max_relative_cost_difference"] = float(
+        np.max(np.abs(costs["float32"] - costs["float64"]) / costs["float64"])
+    )
+    results["grid_score_float32"]["same_10_best"] = bool(
+        np.array_equal(np.argsort(costs["float32"])[:10], np.argsort(costs["float64"])[:10])
+    )
+
+    models = {
+        "float64": (jacobians.model_and_jacobian_rr, (sat_position, sat_velocity)),
+        "float32": (
+            precision.MixedPrecisionModel(
+                jacobians.model_and_jacobian_rr, x_naught, sat_position, sat_velocity
+            ),
+            (),
+        ),
+        "float32_ecef": (
+            precision.MixedPrecisionModel(
+                jacobians.model_and_jacobian_rr, np.zeros(3), sat_position, sat_velocity
+            ),
+            (),
+        ),
+    }
+    fits = {}
+    for name, (model_and_jacobian, sensor_state) in models.items():
+
+        def solve():
+            return ils.IteratedLeastSquares(
+                initial_parameters=x_naught[:, np.newaxis],
+                measurements=measurements[:, np.newaxis],
+                measurement_noise=np.array([0.05]),
+                tol=1e-3,
+                max_iterations=50,
+                model_and_jacobian=model_and_jacobian,
+                verbose=False,
+            ).solve_ils(*sensor_state)
+
+        seconds, peak_bytes, fit = measure(solve)
+        fits[name] = fit
+        results[f"ils_{name}"] = {
+            "seconds": seconds,
+            "peak_mib": peak_bytes / 2**20,
+            "iterations": fit.iterations,
+            "converged": fit.converged,
+            "position_error_m": float(np.linalg.norm(fit.x_estimate[:, 0] - emitter)),
+            "difference_from_float64_m": float(
+                np.linalg.norm(fit.x_estimate - fits["float64"].x_estimate)
+            ),
+            "P_relative_difference": float(
+                np.abs(fit.P - fits["float64"].P).max() / np.abs(fits["float64"].P).max()
+            ),
+        }
+    return results
+
+
+SIZES = (10, 1_000, 100_000, 1_000_000)
+
+
+def measure(func, repeat=3):
+    """Best wall time of func() over repeat runs and the peak traced allocation of one run
+
+    Returns (seconds, peak_bytes, value) where value is what func returned. One untimed
+    call first keeps lazy imports and caches out of the timing.
+    """
+    func()
+    seconds = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        seconds = min(seconds, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak_bytes, value
+
+
+def _suite_cases(seed):
+    """(name, max_n, setup) for every benchmarked function
+
+    setup(n) builds the fixed seed inputs for size n and returns a zero argument callable.
+    Callables of solvers return their iteration count, which is recorded with the timing.
+    """
+    common_ekf = dict(
+        sensor_noise=np.array([0.05]),
+        confidence=0.95,
+        model=model_equations.model_equation_rr,
+        linearized_model=jacobians.range_rate_jacobian,
+    )
+
+    def pass_inputs(n):
+        emitter, sat_position, sat_velocity, measurements = range_rate_pass(n, seed=seed)
+        return emitter + np.array([300.0, -200.0, 0.0]), sat_position, sat_velocity, measurements
+
+    def model_case(func, parameters=3):
+        def setup(n):
+            x, sat_position, sat_velocity, _ = pass_inputs(n)
+            x = np.append(x, 9.4e9)[:parameters]
+            return lambda: func(x, sat_position, sat_velocity)
+
+        return setup
+
+    def tdoa_setup(n):
+        x, sat_position, _, _ = pass_inputs(n + 1)
+        return lambda: jacobians.model_and_jacobian_range_difference(x, sat_position)
+
+    def doa_setup(n):
+        x, sat_position, _, _ = pass_inputs(n)
+        return lambda: jacobians.model_and_jacobian_doa(x[:2], sat_position[:, :2])
+
+    def geodetic_points(n):
+        return random_ecef_points(n, seed)
+
+    def geodetic_to_ecef_setup(n):
+        lla = coordinate_transforms.ecef_to_geodetic_array(geodetic_points(n))
+        return lambda: coordinate_transforms.geodetic_to_ecef(*lla.T)
+
+    def geodetic_feet_to_ecef_setup(n):
+        lla = coordinate_transforms.ecef_to_geodetic_array(geodetic_points(n))
+        lla[:, 2] *= unit_converter.UnitConverter.METERS_TO_FEET
+        out = np.empty((n, 3))
+        return lambda: unit_converter.UnitConverter.geodetic_feet_to_ecef(*lla.T, out=out)
+
+    def ecef_to_geodetic_setup(n):
+        points = geodetic_points(n)
+        return lambda: coordinate_transforms.ecef_to_geodetic_array(points)
+
+    def ecef_to_geodetic_loop_setup(n):
+        points = geodetic_points(n)
+        return lambda: [coordinate_transforms.ecef_to_geodetic(*p) for p in points]
+
+    def local_frame_setup(n):
+        points = geodetic_points(n)
+        site = coordinate_transforms.LocalFrame(35.0, -77.0, 0.0)
+        return lambda: site.to_topocentric(points)
+
+    def topocentric_many_setup(n):
+        points = geodetic_points(n)
+        lla = coordinate_transforms.ecef_to_geodetic_array(points[::-1])
+        return lambda: coordinate_transforms.ecef_to_topocentric_many(
+            points, points[::-1], lla[:, 0], lla[:, 1]
+        )
+
+    def ils_setup(method):
+        def setup(n):
+            x, sat_position, sat_velocity, measurements = pass_inputs(n)
+
+            def solve():
+                return ils.IteratedLeastSquares(
+                    initial_parameters=x[:, np.newaxis],
+                    measurements=measurements[:, np.newaxis],
+                    measurement_noise=np.array([0.05]),
+                    tol=1e-3,
+                    max_iterations=50,
+                    model=model_equations.model_equation_rr,
+                    linearized_model=jacobians.range_rate_jacobian,
+                    method=method,
+                    verbose=False,
+                ).solve_ils(sat_position, sat_velocity).iterations
+
+            return solve
+
+        return setup
+
+    def batched_ils_setup(n, m=20):
+        x, sat_position, sat_velocity, measurements = pass_inputs(m)
+
+        def solve():
+            return int(
+                ils.BatchedIteratedLeastSquares(
+                    initial_parameters=np.tile(x, (n, 1)),
+                    measurements=np.tile(measurements, (n, 1)),
+                    measurement_noise=0.05,
+                    tol=1e-3,
+                    max_iterations=50,
+                    model=model_equations.model_equation_rr,
+                    linearized_model=jacobians.range_rate_jacobian,
+                ).solve_ils(
+                    np.broadcast_to(sat_position, (n, m, 3)),
+                    np.broadcast_to(sat_velocity, (n, m, 3)),
+                )[2].max()
+            )
+
+        return solve
+
+    def foa_setup(n):
+        x, sat_position, sat_velocity, _ = pass_inputs(n)
+        engine = foa.FrequencyOfArrival(sat_position, sat_velocity)
+        rng = np.random.default_rng(seed)
+        measurements = engine.model(np.append(x, 9.4e9)) + rng.normal(0, 1.0, n)
+        return lambda: engine.solve(
+            x + 100.0, measurements, np.array([1.0]), 1e-3, 50, verbose=False
+        ).iterations
+
+    def ekf_stream_setup(n, m=32):
+        x, sat_position, sat_velocity, measurements = pass_inputs(n)
+
+        def run():
+            f = ekf.ExtendedKalmanFilter(
+                x, np.eye(3) * 1e6, measurement=None, **common_ekf
+            )
+            feed = (
+                (measurements[i : i + m], None, sat_position[i : i + m], sat_velocity[i : i + m])
+                for i in range(0, n, m)
+            )
+            for _ in f.stream(feed):
+                pass
+
+        return run
+
+    def ekf_bank_setup(n, m=4):
+        x, sat_position, sat_velocity, measurements = pass_inputs(m)
+        bank = ekf.ExtendedKalmanFilterBank(n_parameters=3, capacity=n, **common_ekf)
+        for _ in range(n):
+            bank.add(x, np.eye(3) * 1e6)
+        return lambda: bank.update(
+            None,
+            np.broadcast_to(measurements, (n, m)),
+            None,
+            np.broadcast_to(sat_position, (n, m, 3)),
+            np.broadcast_to(sat_velocity, (n, m, 3)),
+        )
+
+    def ellipse_setup(n):
+        A = np.random.default_rng(seed).normal(size=(n, 2, 2))
+        P = A @ np.swapaxes(A, 1, 2)
+        return lambda: error_ellipse.error_ellipses(P)
+
+    def grid_search_setup(n):
+        emitter, sat_position, sat_velocity, measurements = range_rate_pass(n, seed=seed)
+        search = grid_search.GridSearch(
+            grid_search.RangeRateGeometry(sat_position, sat_velocity),
+            measurements,
+            np.array([0.05]),
+        )
+        return lambda: search.search_geodetic((34.5, 35.5), (-77.5, -76.5), levels=3)
+
+    return [
+        ("model_equation_rr", 1_000_000, model_case(model_equations.model_equation_rr)),
+        ("range_rate_jacobian", 1_000_000, model_case(jacobians.range_rate_jacobian)),
+        ("model_and_jacobian_rr", 1_000_000, model_case(jacobians.model_and_jacobian_rr)),
+        ("model_equation_foa", 1_000_000, model_case(model_equations.model_equation_foa, 4)),
+        ("jacobian_foa", 1_000_000, model_case(jacobians.jacobian_foa, 4)),
+        ("model_and_jacobian_range_difference", 1_000_000, tdoa_setup),
+        ("model_and_jacobian_doa", 1_000_000, doa_setup),
+        ("geodetic_to_ecef", 1_000_000, geodetic_to_ecef_setup),
+        ("geodetic_feet_to_ecef", 1_000_000, geodetic_feet_to_ecef_setup),
+        ("ecef_to_geodetic_array", 1_000_000, ecef_to_geodetic_setup),
+        ("ecef_to_geodetic_loop", 1_000, ecef_to_geodetic_loop_setup),
+        ("local_frame_to_topocentric", 1_000_000, local_frame_setup),
+        ("ecef_to_topocentric_many", 1_000_000, topocentric_many_setup),
+        ("error_ellipses", 1_000_000, ellipse_setup),
+        ("ils_gauss_newton", 1_000_000, ils_setup("gauss-newton")),
+        ("ils_levenberg_marquardt", 1_000_000, ils_setup("levenberg-marquardt")),
+        ("batched_ils_20_samples", 100_000, batched_ils_setup),
+        ("foa_solve", 1_000_000, foa_setup),
+        ("grid_search_geodetic", 100_000, grid_search_setup),
+        ("ekf_stream_batch_32", 100_000, ekf_stream_setup),
+        ("ekf_bank_update", 100_000, ekf_bank_setup),
+    ]
+
+
+def run_suite(sizes=SIZES, seed=0, repeat=5, only=None):
+    """Time every case at every size up to its max_n with fixed seed inputs
+
+    Returns {"case[n]": {"seconds", "peak_mib", "iterations"}} (iterations for solvers only).
+    only restricts the run to case names containing any of the given substrings.
+    """
+    results = {}
+    for name, max_n, setup in _suite_cases(seed):
+        if only and not any(key in name for key in only):
+            continue
+        for n in sizes:
+            if n > max_n:
+                continue
+            seconds, peak_bytes, value = measure(setup(n), repeat=repeat)
+            entry = {"seconds": seconds, "peak_mib": peak_bytes / 2**20}
+            if isinstance(value, (int, np.integer)):
+                entry["iterations"] = int(value)
+            results[f"{name}[{n}]"] = entry
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold=1.5, min_seconds=1e-2):
+    """Regressions of results against a baseline, as a list of messages
+
+    A case regresses when its time or peak memory grows past threshold x the baseline
+    (times below min_seconds are too noisy to compare) or it needs more iterations.
+    """
+    regressions = []
+    for key, entry in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        if (
+            max(entry["seconds"], reference["seconds"]) >= min_seconds
+            and entry["seconds"] > threshold * reference["seconds"]
+        ):
+            regressions.append(
+                f"{key}: {entry['seconds']:.4g} s vs baseline {reference['seconds']:.4g} s"
+            )
+        if entry["peak_mib"] > threshold * reference["peak_mib"] + 1:
+            regressions.append(
+                f"{key}: {entry['peak_mib']:.1f} MiB vs baseline {reference['peak_mib']:.1f} MiB"
+            )
+        if entry.get("iterations", 0) > reference.get("iterations", np.inf):
+            regressions.append(
+                f"{key}: {entry['iterations']} iterations vs baseline {reference['iterations']}"
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Emitter geolocation benchmark suite")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default="benchmark_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=1.5)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="+")
+    parser.add_argument(
+        "--comparisons", action="store_true", help="run the side by side benchmark_* reports"
+    )
+    args = parser.parse_args(argv)
+    if args.comparisons:
+        print(benchmark_ecef_to_geodetic())
+        print(benchmark_geometry_cache())
+        print(benchmark_precision())
+        print(benchmark_streaming_ekf())
+        print(benchmark_ekf_bank())
+        print(benchmark_pipeline())
+        print(benchmark_error_ellipses())
+        print(benchmark_foa())
+        print(benchmark_ils_methods())
+        print(benchmark_sliding_window())
+        print(benchmark_parallel_ils())
+        return 0
+
+    results = run_suite(args.sizes, repeat=args.repeat, only=args.only)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    for key, entry in results.items():
+        print(
+            f"{key:50s} {entry['seconds'] * 1e3:12.3f} ms {entry['peak_mib']:10.2f} MiB"
+            + (f" {entry['iterations']:4d} it" if "iterations" in entry else "")
+        )
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"baseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}, run with --save-baseline to create one")
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare_to_baseline(results, json.load(f), args.threshold)
+    if regressions:
+        print(f"PERFORMANCE REGRESSION ({len(regressions)} cases past {args.threshold}x):")
+        for message in regressions:
+            print(f"  {message}")
+        return 1
+    print("no regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,51 @@
 import numpy as np
+from geometry_cache import DEFAULT_CACHE
 
 
-def geodetic_to_ecef(latitude, longitude, altitude=0.0):
-    """Convert latitude/longitude/altitude(HAE) to ECEF Coordinate Frame"""
+def _site_key(*coordinates):
+    """Float tuple of a fixed site's scalar coordinates, None when any is an array"""
+    site = []
+    for value in coordinates:
+        if type(value) is not float and type(value) is not int:  # skip np.ndim on floats
+            if np.ndim(value) != 0:
+                return None
+            value = float(value)
+        site.append(value)
+    return tuple(site)
+
+
+def geodetic_to_ecef(
+    latitude, longitude, altitude=0.0, out=None, track_id=None, cache=False
+):
+    """Convert latitude/longitude/altitude(HAE) to ECEF Coordinate Frame
+
+    Returns [x, y, z] stacked on the first axis. With out, an (..., 3) buffer, the
+    coordinates are written into its last axis instead and out is returned.
+
+    With cache=True a fixed sensor site (scalar inputs) is kept in
+    geometry_cache.DEFAULT_CACHE and returned as a copy, a lookup of a site used before is
+    cheaper than the conversion but a miss costs more, so loops over distinct points
+    leave it off. Arrays are cached when a track_id names them, the cached array is
+    returned read only. The arrays are not checked on lookup, a track_id must name arrays
+    that never change (see GeometryCache).
+    """
+    if out is not None:
+        return _geodetic_to_ecef_into(latitude, longitude, altitude, out)
+    if track_id is not None:
+        return DEFAULT_CACHE.get(
+            ("geodetic_to_ecef", track_id),
+            lambda: _geodetic_to_ecef(latitude, longitude, altitude),
+        )
+    site = _site_key(latitude, longitude, altitude) if cache else None
+    if site is not None:
+        return DEFAULT_CACHE.get(
+            ("geodetic_to_ecef", site),
+            lambda: _geodetic_to_ecef(latitude, longitude, altitude),
+        ).copy()
+    return _geodetic_to_ecef(latitude, longitude, altitude)
+
+
+def _geodetic_to_ecef(latitude, longitude, altitude):
     latitude = np.radians(latitude)
     longitude = np.radians(longitude)
     a = 6378.137 * 1000
@@ -14,6 +57,36 @@ def geodetic_to_ecef(latitude, longitude, altitude=0.0):
     return np.array([x, y, z], dtype=float)
 
 
+def _geodetic_to_ecef_into(latitude, longitude, altitude, out):
+    """geodetic_to_ecef writing into out[..., :3] with three reused scratch arrays
+
+    altitude may be out[..., 2] itself, it is read before that column is written.
+    """
+    a = 6378.137 * 1000
+    e_squared = 0.00669437999013
+    x, y, z = out[..., 0], out[..., 1], out[..., 2]
+    sin_lat, cos_lat, N = (np.empty(out.shape[:-1]) for _ in range(3))
+    np.radians(latitude, out=sin_lat)
+    np.cos(sin_lat, out=cos_lat)
+    np.sin(sin_lat, out=sin_lat)
+    np.square(sin_lat, out=N)
+    N *= -e_squared
+    N += 1
+    np.sqrt(N, out=N)
+    np.divide(a, N, out=N)
+    # x and y hold (N + h) cos(lat), z is written last from N
+    np.add(N, altitude, out=x)
+    x *= cos_lat
+    N *= 1 - e_squared
+    N += altitude
+    N *= sin_lat
+    longitude = np.radians(longitude, out=cos_lat)
+    np.multiply(x, np.sin(longitude, out=sin_lat), out=y)
+    x *= np.cos(longitude, out=sin_lat)
+    z[...] = N
+    return out
+
+
 def ecef_to_geodetic(x, y, z):
     """Convert ECEF Coorindates to Geodetic (Lat, Lon, Altitude (HAE))"""
     epsilon_1 = 1e-6
@@ -43,27 +116,85 @@ def ecef_to_geodetic(x, y, z):
     return lat, lon, alt  # Reutrns in degrees
 
 
+def ecef_to_geodetic_array(ecef):
+    """Convert an (N, 3) array of ECEF points to (N, 3) [lat (deg), lon (deg), alt (HAE)]
+
+    Closed form solution with no iteration, valid everywhere outside ~43 km of the earth's
+    centre. A single (3,) point returns (3,).
+    REF: Direct transformation from geocentric coordinates to geodetic coordinates, H. Vermeille
+    """
+    ecef = np.asarray(ecef, dtype=float)
+    a = 6378.137 * 1000
+    e_squared = 0.00669437999013
+    e_fourth = e_squared**2
+    x, y, z = ecef[..., 0], ecef[..., 1], ecef[..., 2]
+
+    rho_squared = x**2 + y**2
+    rho = np.sqrt(rho_squared)
+    p = rho_squared / a**2
+    q = ((1 - e_squared) / a**2) * z**2
+    r = (p + q - e_fourth) / 6
+    s = e_fourth * p * q / (4 * r**3)
+    t = np.cbrt(1 + s + np.sqrt(s * (2 + s)))
+    u = r * (1 + t + 1 / t)
+    v = np.sqrt(u**2 + e_fourth * q)
+    w = e_squared * (u + v - q) / (2 * v)
+    k = np.sqrt(u + v + w**2) - w
+    D = k * rho / (k + e_squared)
+    D_z_norm = np.sqrt(D**2 + z**2)
+
+    lat = 2 * np.arctan2(z, D + D_z_norm)
+    lon = np.arctan2(y, x)
+    alt = ((k + e_squared - 1) / k) * D_z_norm
+    return np.stack([np.rad2deg(lat), np.rad2deg(lon), alt], axis=-1)
+
+
+def enu_rotation_matrix(
+    observer_latitude, observer_longitude, track_id=None, cache=False
+):
+    """ECEF to East-North-Up rotation for an observer (degrees)
+
+    Scalar lat/lon give a 3 x 3 matrix, arrays of N lat/lon give an (N, 3, 3) stack.
+    Cached like geodetic_to_ecef: fixed sites with cache=True (returned as copies), stacks
+    when a track_id names them (returned read only).
+    """
+    if track_id is not None:
+        return DEFAULT_CACHE.get(
+            ("enu_rotation_matrix", track_id),
+            lambda: _enu_rotation_matrix(observer_latitude, observer_longitude),
+        )
+    site = _site_key(observer_latitude, observer_longitude) if cache else None
+    if site is not None:
+        return DEFAULT_CACHE.get(
+            ("enu_rotation_matrix", site),
+            lambda: _enu_rotation_matrix(observer_latitude, observer_longitude),
+        ).copy()
+    return _enu_rotation_matrix(observer_latitude, observer_longitude)
+
+
+def _enu_rotation_matrix(observer_latitude, observer_longitude):
+    lat_rads = np.radians(observer_latitude)
+    lon_rads = np.radians(observer_longitude)
+    sin_lat, cos_lat = np.sin(lat_rads), np.cos(lat_rads)
+    sin_lon, cos_lon = np.sin(lon_rads), np.cos(lon_rads)
+    R = np.empty(np.shape(lat_rads) + (3, 3))
+    R[..., 0, 0] = -sin_lon
+    R[..., 0, 1] = cos_lon
+    R[..., 0, 2] = 0
+    R[..., 1, 0] = -sin_lat * cos_lon
+    R[..., 1, 1] = -sin_lat * sin_lon
+    R[..., 1, 2] = cos_lat
+    R[..., 2, 0] = cos_lat * cos_lon
+    R[..., 2, 1] = cos_lat * sin_lon
+    R[..., 2, 2] = sin_lat
+    return R
+
+
 def ecef_to_topocentric(
     target_ecef, observer_ecef, observer_latitude, observer_longitude
 ):
     """Given an observer location convert target coordinates from ECEF to Topocentric (Observer perspective coords)"""
-    lat_rads = np.radians(observer_latitude)
-    lon_rads = np.radians(observer_longitude)
-    R = np.array(
-        [
-            [-np.sin(lon_rads), np.cos(lon_rads), 0],
-            [
-                -np.sin(lat_rads) * np.cos(lon_rads),
-                -np.sin(lat_rads) * np.sin(lon_rads),
-                np.cos(lat_rads),
-            ],
-            [
-                np.cos(lat_rads) * np.cos(lon_rads),
-                np.cos(lat_rads) * np.sin(lon_rads),
-                np.sin(lat_rads),
-            ],
-        ]
-    )
+    R = enu_rotation_matrix(observer_latitude, observer_longitude)
     observer_to_target = target_ecef - observer_ecef
     target_topo = R @ observer_to_target
     return target_topo
@@ -73,21 +204,54 @@ def topocentric_to_ecef(
     target_topo, observer_ecef, observer_latitude, observer_longitude
 ):
     """Given Topocentric Coordinates of the target from the perspective of the observer convert back to ECEF coordinates"""
-    lat_rads = np.radians(observer_latitude)
-    lon_rads = np.radians(observer_longitude)
-    R = np.array(
-        [
-            [-np.sin(lon_rads), np.cos(lon_rads), 0],
-            [
-                -np.sin(lat_rads) * np.cos(lon_rads),
-                -np.sin(lat_rads) * np.sin(lon_rads),
-                np.cos(lat_rads),
-            ],
-            [
-                np.cos(lat_rads) * np.cos(lon_rads),
-                np.cos(lat_rads) * np.sin(lon_rads),
-                np.sin(lat_rads),
-            ],
-        ]
-    ).T
+    R = enu_rotation_matrix(observer_latitude, observer_longitude).T
     return (R @ target_topo) + observer_ecef
+
+
+class LocalFrame:
+    """Topocentric (ENU) frame of a fixed observer with the rotation computed once
+
+    Example Input and output
+    site = LocalFrame(observer_latitude=35.0, observer_longitude=-77.0, observer_altitude=10.0)
+    enu = site.to_topocentric(targets_ecef)  # (N, 3) -> (N, 3)
+    ecef = site.to_ecef(enu)  # (N, 3) -> (N, 3)
+    """
+
+    def __init__(self, observer_latitude, observer_longitude, observer_altitude=0.0):
+        self.observer_latitude = observer_latitude
+        self.observer_longitude = observer_longitude
+        self.observer_altitude = observer_altitude
+        # sensor sites recur across searches and passes, look them up in the site cache
+        self.observer_ecef = geodetic_to_ecef(
+            observer_latitude, observer_longitude, observer_altitude, cache=True
+        )
+        self.R = enu_rotation_matrix(observer_latitude, observer_longitude, cache=True)
+
+    def to_topocentric(self, target_ecef):
+        """ECEF (3,) or (N, 3) targets to ENU (3,) or (N, 3)"""
+        return (np.asarray(target_ecef) - self.observer_ecef) @ self.R.T
+
+    def to_ecef(self, target_topo):
+        """ENU (3,) or (N, 3) targets to ECEF (3,) or (N, 3)"""
+        return np.asarray(target_topo) @ self.R + self.observer_ecef
+
+
+def ecef_to_topocentric_many(
+    target_ecef, observer_ecef, observer_latitude, observer_longitude, track_id=None
+):
+    """Per row topocentric conversion for moving observers
+
+    Row i of the (N, 3) targets is expressed in the ENU frame of observer i, observer
+    ECEF positions are (N, 3) and lat/lon are (N,) in degrees. A track_id naming the
+    observer track caches its (N, 3, 3) rotations between calls.
+    """
+    R = enu_rotation_matrix(observer_latitude, observer_longitude, track_id)
+    return np.einsum("nij,nj->ni", R, target_ecef - observer_ecef)
+
+
+def topocentric_to_ecef_many(
+    target_topo, observer_ecef, observer_latitude, observer_longitude, track_id=None
+):
+    """Inverse of ecef_to_topocentric_many, (N, 3) ENU rows back to ECEF"""
+    R = enu_rotation_matrix(observer_latitude, observer_longitude, track_id)
+    return np.einsum("nji,nj->ni", R, target_topo) + observer_ecef
@@ -1,6 +1,8 @@
 import numpy as np
 import scipy
-from typing import Callable
+import noise_models
+from instrumentation import DISABLED
+from typing import Callable, Iterable
 
 
 class ExtendedKalmanFilter:
@@ -11,19 +13,23 @@ class ExtendedKalmanFilter:
         measurement: np.ndarray,
         sensor_noise: np.ndarray,
         confidence: float,
-        model: Callable,
-        linearized_model: Callable,
+        model: Callable = None,
+        linearized_model: Callable = None,
+        model_and_jacobian: Callable = None,
+        instrumentation=None,
     ):
         """Initialization step of EKF algorithm
 
         Args:
             initial_parameters (np.ndarray): a 1 x n row vector of initial parameters
             initial_covariance (np.ndarray): A nxn covariance matrix of uncertainty (error covariance matrix)
-            measurement (np.ndarray): a 1x1 matrix of the current measurement
+            measurement (np.ndarray): a 1x1 matrix of the current measurement, may be None when only streaming
             sensor_noise (np.ndarray): a 1 x n row vector of sensor noise (uncertainty variance)
             confidence (float): A scalar (0 < confidence < 1) used to determine confidence intervals of estimated parameter
             model (Callable): The model equation used for prediction of parameters
             linearized_model (Callable): H - The jacobian of the model equation
+            model_and_jacobian (Callable): fused h(x) and H, used instead of model and linearized_model
+            instrumentation (SolverInstrumentation): per update phase timings and metrics, off by default
 
         Raises:
             ValueError: h(x) model equation requires a function
@@ -35,18 +41,30 @@ class ExtendedKalmanFilter:
         self.sensor_noise = sensor_noise
         self.measurement = measurement
         self.confidence = confidence
-        if not callable(model):
-            raise ValueError("A model equation is required")
-        if not callable(linearized_model):
-            raise ValueError("A linearized model is required")
+        if model_and_jacobian is not None:
+            if not callable(model_and_jacobian):
+                raise ValueError("A fused model and jacobian must be callable")
+        else:
+            if not callable(model):
+                raise ValueError("A model equation is required")
+            if not callable(linearized_model):
+                raise ValueError("A linearized model is required")
         self.model = model
         self.linearized_model = linearized_model
+        self.model_and_jacobian = model_and_jacobian
+        self.instrumentation = instrumentation
+        # constants reused by every update
+        self._chisq_k = None
+        self._identity = np.eye(np.size(initial_parameters))
+        self._default_R = {}
 
     def model_equation(self, *args, **kwargs):
         """Provided Model equation h(x_current) [Mathematical model of the measurement]
 
         Given an initial or currrent parameter vector return the predicted parameters (x^hat)
         """
+        if self.model is None:
+            return self.model_and_jacobian(*args, **kwargs)[0]
         return self.model(*args, **kwargs)
 
     def jacobian(self, *args, **kwargs):
@@ -54,39 +72,351 @@ class ExtendedKalmanFilter:
 
         Returns: A jacobian matrix H
         """
+        if self.linearized_model is None:
+            return self.model_and_jacobian(*args, **kwargs)[1]
         return self.linearized_model(*args, **kwargs)
 
-    def measurement_error_covariance(self):
+    def measurement_error_covariance(self, sensor_noise=None, n=None):
         """Provided measurement standard deviations (since we consider measurements to be IID and uncorrelated) only a diagonal matrix
-        In the future may need to update this equation"""
-        return np.eye(len(self.measurement)) * self.sensor_noise**2
+        In the future may need to update this equation
+
+        Defaults to the filter's sensor_noise and stored measurement, the R built from the
+        default sensor_noise is cached per measurement count.
+        """
+        if n is None:
+            n = len(self.measurement)
+        if sensor_noise is None:
+            R = self._default_R.get(n)
+            if R is None:
+                R = self._default_R[n] = noise_models.as_noise_model(
+                    self.sensor_noise, n
+                ).covariance(n)
+            return R
+        return noise_models.as_noise_model(sensor_noise, n).covariance(n)
 
     def chisq_k(self):
-        """Helper function for confidence interval generation"""
-        k = scipy.stats.chi2.ppf(self.confidence, len(self.initial_parameters))
-        return k
+        """Helper function for confidence interval generation, the quantile is computed once"""
+        if self._chisq_k is None:
+            self._chisq_k = scipy.stats.chi2.ppf(
+                self.confidence, len(self.initial_parameters)
+            )
+        return self._chisq_k
 
-    def solve_ekf(self, *args, **kwargs):
-        """Generate EKF estimate based on a prior parameters, current measurement, and predicted parameters"""
-        R = self.measurement_error_covariance()
-        H = self.jacobian(self.initial_parameters, *args, **kwargs)
-        K = (
-            self.initial_covariance
-            @ H.T
-            @ np.linalg.pinv((H @ self.initial_covariance @ H.T) + R)
+    def update(self, measurement, sensor_noise=None, *args, **kwargs):
+        """One EKF measurement update from the current state, returns (x_update, P_update)
+
+        measurement may be a single sample or a micro-batch of m samples, in which case
+        the sensor state in args must carry the same m rows so h and H stack to (m,) and
+        (m, n). sensor_noise overrides the filter's sensor_noise for this update only.
+        The covariance uses the Joseph form (I - KH) P (I - KH)^T + K R K^T which stays
+        symmetric positive semi-definite under round off. Batches of more measurements
+        than parameters with uncorrelated noise find the gain from the equivalent
+        information form, whose cost grows linearly with m, unless P is singular.
+        """
+        probe = self.instrumentation or DISABLED
+        x = self.initial_parameters
+        P = self.initial_covariance
+        start = probe.clock()
+        if self.model_and_jacobian is not None:
+            h, H = self.model_and_jacobian(x, *args, **kwargs)
+            start = probe.phase("model_and_jacobian", start)
+        else:
+            h = self.model_equation(x, *args, **kwargs)
+            start = probe.phase("model", start)
+            H = self.jacobian(x, *args, **kwargs)
+            start = probe.phase("jacobian", start)
+        innovation = np.reshape(measurement, -1) - np.reshape(h, -1)
+        H = H.reshape(innovation.size, -1)
+        m, n = H.shape
+        noise = noise_models.as_noise_model(
+            self.sensor_noise if sensor_noise is None else sensor_noise, m
         )
-        h = self.model_equation(self.initial_parameters, *args, **kwargs)
-        x_update = self.initial_parameters + K @ (self.measurement - h)
-        P_update = (
-            np.eye(len(self.initial_parameters)) - K @ H
-        ) @ self.initial_covariance
+        factor = None
+        if m > n and not isinstance(noise, noise_models.DenseNoise):
+            try:
+                factor = scipy.linalg.cho_factor(P, check_finite=False)
+            except np.linalg.LinAlgError:
+                pass  # singular prior, e.g. a parameter held exactly, keep the gain form
+        if factor is not None:
+            # micro-batches with uncorrelated noise solve the information form
+            # (P^-1 + H^T R^-1 H) dx = H^T R^-1 (z - h), which factors an n x n matrix
+            # where the gain form would factor the m x m S
+            H_white = noise.whiten(H)
+            information, gradient = noise_models.normal_equations(
+                H_white, noise.whiten(innovation)
+            )
+            system = scipy.linalg.cho_solve(factor, self._identity, check_finite=False)
+            system += information
+            correction_term, P_information = noise_models.solve_information(
+                system.copy(), gradient
+            )
+            # with K = P+ H^T R^-1 the Joseph terms are KH = P+ H^T R^-1 H and
+            # K R K^T = KH P+, both n x n
+            KH = P_information @ information
+            KRKt = KH @ P_information
+        else:
+            R = self.measurement_error_covariance(sensor_noise, m)
+            PHt = P @ H.T
+            system = S = H @ PHt + R  # innovation covariance
+            if m == 1:
+                K = PHt / S[0, 0]
+            else:
+                # S is built from our own products, skip scipy's per call finiteness scan
+                K = scipy.linalg.cho_solve(
+                    scipy.linalg.cho_factor(S, check_finite=False),
+                    PHt.T,
+                    check_finite=False,
+                ).T  # P H^T S^-1 without inverting S
+            correction_term = K @ innovation
+            KH = K @ H
+            KRKt = K @ R @ K.T
+        x_update = x + correction_term.reshape(np.shape(x))
+        start = probe.phase("solve", start)
+        A = self._identity - KH
+        P_update = A @ P @ A.T + KRKt
+        probe.phase("covariance", start)
+        if probe.enabled:
+            probe.end_iteration(
+                "ekf",
+                measurements=m,
+                residual_norm=np.linalg.norm(innovation),
+                step_norm=np.linalg.norm(correction_term),
+                condition_number=np.linalg.cond(system),
+            )
         self.initial_parameters = x_update
         self.initial_covariance = P_update
+        return x_update, P_update
+
+    def stream(self, feed: Iterable):
+        """Run the filter over a measurement feed, yielding (x_estimate, P) after each update
+
+        Each item of feed is (measurement, sensor_noise, *sensor_state), e.g.
+        (doppler, sigma, sat_position, sat_velocity), where sensor_noise may be None to use
+        the filter's sensor_noise. Items may be single samples or micro-batches. The feed
+        is consumed lazily so it can be a generator over a live source.
+
+        for x_estimate, P in ekf.stream(feed):
+            ...
+        """
+        update = self.update
+        for measurement, sensor_noise, *sensor_state in feed:
+            yield update(measurement, sensor_noise, *sensor_state)
+
+    def confidence_interval(self, x_estimate, P):
+        """Lower and upper confidence bounds of an estimate from the cached chi squared quantile"""
         k = self.chisq_k()
-        ci_lower = x_update - np.sqrt(k * P_update)
-        ci_upper = x_update + np.sqrt(k * P_update)
+        return x_estimate - np.sqrt(k * P), x_estimate + np.sqrt(k * P)
+
+    def solve_ekf(self, *args, **kwargs):
+        """Generate EKF estimate based on a prior parameters, current measurement, and predicted parameters"""
+        x_update, P_update = self.update(self.measurement, None, *args, **kwargs)
+        ci_lower, ci_upper = self.confidence_interval(x_update, P_update)
         return {
             "ci_lower": ci_lower,
             "ci_upper": ci_upper,
             "x_estimate": x_update,
         }, P_update
+
+
+class ExtendedKalmanFilterBank:
+    """Many ExtendedKalmanFilters held as one (B, n) state array and (B, n, n) covariance stack
+
+    Every filter shares the same model, the model and linearized model must accept stacked
+    parameters of shape (B, n) followed by (B, m, ...) sensor state arrays and return (B, m)
+    predictions and a (B, m, n) jacobian. Tracks are added and removed through a free list
+    so slots are reused and the arrays are only reallocated when the bank is full.
+
+    Example Input and output
+    bank = ExtendedKalmanFilterBank(n_parameters=3,
+                                    sensor_noise=np.array([sigma]),
+                                    confidence=0.95,
+                                    model=model_equations.model_equation_rr,
+                                    linearized_model=jacobians.range_rate_jacobian)
+    track = bank.add(x_naught, P_naught)
+    bank.predict(Q)
+    x_estimate, P = bank.update(tracks [(k,)], z [(k, m)], None, sat_position [(k, m, 3)], sat_velocity [(k, m, 3)])
+    bank.remove(track)
+    """
+
+    def __init__(
+        self,
+        n_parameters: int,
+        sensor_noise: np.ndarray,
+        confidence: float,
+        model: Callable,
+        linearized_model: Callable,
+        capacity: int = 64,
+        instrumentation=None,
+    ):
+        """
+        Args:
+            n_parameters (int): n, length of every filter's parameter vector
+            sensor_noise (np.ndarray): default sigma, scalar, per filter (k,) or per measurement (k, m)
+            confidence (float): A scalar (0 < confidence < 1) used to determine confidence intervals of estimated parameter
+            model (Callable): The batched model equation h(x)
+            linearized_model (Callable): H - The batched jacobian of the model equation
+            capacity (int): number of filter slots allocated up front
+            instrumentation (SolverInstrumentation): per update phase timings and metrics, off by default
+        """
+        if not callable(model):
+            raise ValueError("A model equation is required")
+        if not callable(linearized_model):
+            raise ValueError("A linearized model is required")
+        self.n_parameters = n_parameters
+        self.sensor_noise = sensor_noise
+        self.confidence = confidence
+        self.model = model
+        self.linearized_model = linearized_model
+        self.instrumentation = instrumentation
+        self.x = np.zeros((capacity, n_parameters))
+        self.P = np.zeros((capacity, n_parameters, n_parameters))
+        self.active = np.zeros(capacity, dtype=bool)
+        self._free = list(range(capacity - 1, -1, -1))
+        self._chisq_k = None
+        self._identity = np.eye(n_parameters)
+
+    def __len__(self):
+        return int(self.active.sum())
+
+    @property
+    def capacity(self):
+        return self.active.size
+
+    @property
+    def tracks(self):
+        """Slot indices of the filters currently in the bank"""
+        return np.flatnonzero(self.active)
+
+    def _grow(self):
+        """Double the number of slots, existing tracks keep their indices"""
+        old = self.capacity
+        new = max(1, 2 * old)
+        self.x = np.concatenate([self.x, np.zeros((new - old, self.n_parameters))])
+        self.P = np.concatenate(
+            [self.P, np.zeros((new - old, self.n_parameters, self.n_parameters))]
+        )
+        self.active = np.concatenate([self.active, np.zeros(new - old, dtype=bool)])
+        self._free.extend(range(new - 1, old - 1, -1))
+
+    def add(self, initial_parameters: np.ndarray, initial_covariance: np.ndarray):
+        """Start a filter in a free slot and return its track index"""
+        if not self._free:
+            self._grow()
+        track = self._free.pop()
+        self.x[track] = np.reshape(initial_parameters, -1)
+        self.P[track] = initial_covariance
+        self.active[track] = True
+        return track
+
+    def remove(self, track: int):
+        """Drop a filter, its slot is reused by the next add"""
+        if not self.active[track]:
+            raise ValueError(f"track {track} is not in the bank")
+        self.active[track] = False
+        self._free.append(track)
+
+    def _as_tracks(self, tracks):
+        """Normalise a boolean mask over the slots or an array of track indices to indices
+
+        Masked out slots are skipped, but an index that is not an active track (removed,
+        never added or out of range) or appears twice raises ValueError.
+        """
+        if tracks is None:
+            return self.tracks
+        tracks = np.asarray(tracks)
+        if tracks.dtype == bool:
+            if tracks.size > self.capacity:
+                raise ValueError(
+                    f"mask over {tracks.size} slots, the bank has {self.capacity}"
+                )
+            return np.flatnonzero(tracks.reshape(-1) & self.active[: tracks.size])
+        if tracks.size and not np.issubdtype(tracks.dtype, np.integer):
+            raise ValueError("tracks must be a boolean mask or integer track indices")
+        tracks = tracks.reshape(-1).astype(np.intp)
+        valid = (tracks >= 0) & (tracks < self.capacity)
+        valid[valid] = self.active[tracks[valid]]
+        if not valid.all():
+            raise ValueError(f"tracks {tracks[~valid].tolist()} are not in the bank")
+        if np.unique(tracks).size != tracks.size:
+            raise ValueError("tracks must not repeat")
+        return tracks
+
+    def chisq_k(self):
+        """Helper function for confidence interval generation, the quantile is computed once"""
+        if self._chisq_k is None:
+            self._chisq_k = scipy.stats.chi2.ppf(self.confidence, self.n_parameters)
+        return self._chisq_k
+
+    def measurement_variances(self, sensor_noise, shape):
+        """Diagonal of R broadcast to (k, m) for k filters with m measurements each"""
+        if sensor_noise is None:
+            sensor_noise = self.sensor_noise
+        sigma = np.asarray(sensor_noise, dtype=float)
+        if sigma.ndim == 1 and sigma.size == shape[0] and sigma.size != 1:
+            sigma = sigma[:, np.newaxis]
+        return np.broadcast_to(sigma**2, shape)
+
+    def predict(self, process_noise: np.ndarray = None, tracks=None):
+        """Stationary emitter prediction, x is unchanged and P grows by the process noise Q"""
+        if process_noise is None:
+            return
+        tracks = self._as_tracks(tracks)
+        self.P[tracks] += process_noise
+
+    def update(self, tracks, measurements, sensor_noise=None, *args, **kwargs):
+        """Masked measurement update of the filters in tracks, returns their (x_update, P_update)
+
+        tracks is a boolean mask over the slots or an index array of the k filters that
+        received measurements this tick, measurements are (k, m) and every sensor state array
+        in args carries the same k leading rows. Filters outside tracks are left untouched,
+        with no tracks the model is not called and (0, n), (0, n, n) arrays are returned.
+        """
+        probe = self.instrumentation or DISABLED
+        tracks = self._as_tracks(tracks)
+        x = self.x[tracks]
+        P = self.P[tracks]
+        if tracks.size == 0:  # a tick where no filter received measurements
+            return x, P
+        start = probe.clock()
+        h = self.model(x, *args, **kwargs)
+        innovation = np.reshape(measurements, (tracks.size, -1)) - np.reshape(
+            h, (tracks.size, -1)
+        )
+        start = probe.phase("model", start)
+        H = np.reshape(
+            self.linearized_model(x, *args, **kwargs),
+            (tracks.size, innovation.shape[1], self.n_parameters),
+        )
+        start = probe.phase("jacobian", start)
+        r = self.measurement_variances(sensor_noise, innovation.shape)
+        PHt = P @ np.swapaxes(H, 1, 2)
+        S = H @ PHt  # innovation covariance, R is added on the diagonal
+        S[:, np.arange(S.shape[1]), np.arange(S.shape[1])] += r
+        if innovation.shape[1] == 1:
+            K = PHt / S
+        else:
+            K = np.swapaxes(np.linalg.solve(S, np.swapaxes(PHt, 1, 2)), 1, 2)
+        x_update = x + np.einsum("bnm,bm->bn", K, innovation)
+        start = probe.phase("solve", start)
+        A = self._identity - K @ H
+        KR = K * r[:, np.newaxis, :]
+        P_update = A @ P @ np.swapaxes(A, 1, 2) + KR @ np.swapaxes(K, 1, 2)
+        probe.phase("covariance", start)
+        if probe.enabled:
+            probe.end_iteration(
+                "ekf_bank",
+                tracks=tracks.size,
+                residual_norm=np.linalg.norm(innovation),
+                step_norm=np.linalg.norm(x_update - x),
+            )
+        self.x[tracks] = x_update
+        self.P[tracks] = P_update
+        return x_update, P_update
+
+    def confidence_interval(self, tracks=None):
+        """Per parameter lower and upper confidence bounds, each (k, n)"""
+        tracks = self._as_tracks(tracks)
+        half_width = np.sqrt(
+            self.chisq_k() * np.diagonal(self.P[tracks], axis1=1, axis2=2)
+        )
+        return self.x[tracks] - half_width, self.x[tracks] + half_width
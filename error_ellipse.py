@@ -1,36 +1,29 @@
 import scipy
 import numpy as np
+from functools import lru_cache
 
 
-def plot_error_ellipse(P, center=(0, 0), confidence=0.95, ax=None):
-    # P = UDU.T
-    eigenvalues, eigenvectors = np.linalg.eig(P)
-    semi_major_vector = eigenvectors[:, eigenvalues.argmax()]
-    semi_minor_vector = eigenvectors[:, eigenvalues.argmin()]
+@lru_cache(maxsize=None)
+def chi2_quantile(confidence, dof):
+    """Chi squared quantile for a confidence and degrees of freedom, computed once per pair"""
+    return scipy.stats.chi2.ppf(confidence, df=dof)
 
-    chi2_val = scipy.stats.chi2.ppf(confidence, df=semi_major_vector.size)
-    theta = np.linspace(0, 2 * np.pi, 100)
+
+def plot_error_ellipse(P, center=(0, 0), confidence=0.95, ax=None, n_points=100):
+    # P = UDU.T, eigh returns ascending eigenvalues so the major axis is last
+    eigenvalues, eigenvectors = np.linalg.eigh(P)
+    semi_major_vector = eigenvectors[:, 1]
+    semi_minor_vector = eigenvectors[:, 0]
+
+    chi2_val = chi2_quantile(confidence, semi_major_vector.size)
+    theta = np.linspace(0, 2 * np.pi, n_points)
     ellipse = np.array([np.cos(theta), np.sin(theta)])
-    D = np.diag(
-        np.sqrt(
-            np.array(
-                [
-                    eigenvalues[eigenvalues.argmax()],
-                    eigenvalues[eigenvalues.argmin()],
-                ]
-            )
-            * chi2_val
-        )
-    )
+    D = np.diag(np.sqrt(eigenvalues[::-1] * chi2_val))
     ellipse_points = np.array([semi_major_vector, semi_minor_vector]).T @ D @ ellipse
     ellipse_points[0, :] += center[0]
     ellipse_points[1, :] += center[1]
-    semi_major = semi_major_vector * np.sqrt(
-        eigenvalues[eigenvalues.argmax()] * chi2_val
-    )
-    semi_minor = semi_minor_vector * np.sqrt(
-        eigenvalues[eigenvalues.argmin()] * chi2_val
-    )
+    semi_major = semi_major_vector * np.sqrt(eigenvalues[1] * chi2_val)
+    semi_minor = semi_minor_vector * np.sqrt(eigenvalues[0] * chi2_val)
     return ellipse_points, semi_major, semi_minor
     # ax.plot(
     #     ellipse_points[0, :],
@@ -44,3 +37,71 @@ def plot_error_ellipse(P, center=(0, 0), confidence=0.95, ax=None):
     # ax.axhline(0, color='black', linewidth=0.5)
     # ax.axvline(0, color='black', linewidth=0.5)
     # ax.set_aspect('equal', 'box')
+
+
+def error_ellipses(P, centers=None, confidence=0.95, n_points=None):
+    """Confidence ellipses of a (B, 2, 2) stack of covariances (a single 2 x 2 also works)
+
+    Uses the closed form eigen decomposition of a symmetric 2 x 2 matrix
+    lambda = (P_xx + P_yy) / 2 +/- sqrt(((P_xx - P_yy) / 2)^2 + P_xy^2)
+    theta = atan2(2 P_xy, P_xx - P_yy) / 2
+
+    Returns a dict of semi_major and semi_minor lengths (B,), orientation (B,) of the major
+    axis in radians counter clockwise from x and area (B,). When n_points is given "points"
+    holds (B, n_points, 2) boundary points around centers (default the origin).
+    """
+    P = np.asarray(P, dtype=float)
+    p_xx, p_yy, p_xy = P[..., 0, 0], P[..., 1, 1], P[..., 0, 1]
+    mean = 0.5 * (p_xx + p_yy)
+    radius = np.hypot(0.5 * (p_xx - p_yy), p_xy)
+    k = chi2_quantile(confidence, 2)
+    semi_major = np.sqrt(k * (mean + radius))
+    semi_minor = np.sqrt(k * np.maximum(mean - radius, 0))
+    orientation = 0.5 * np.arctan2(2 * p_xy, p_xx - p_yy)
+    result = {
+        "semi_major": semi_major,
+        "semi_minor": semi_minor,
+        "orientation": orientation,
+        "area": np.pi * semi_major * semi_minor,
+    }
+    if n_points:
+        theta = np.linspace(0, 2 * np.pi, n_points)
+        cos_o, sin_o = np.cos(orientation)[..., np.newaxis], np.sin(orientation)[..., np.newaxis]
+        u = semi_major[..., np.newaxis] * np.cos(theta)
+        v = semi_minor[..., np.newaxis] * np.sin(theta)
+        points = np.stack([u * cos_o - v * sin_o, u * sin_o + v * cos_o], axis=-1)
+        if centers is not None:
+            points += np.asarray(centers, dtype=float)[..., np.newaxis, :2]
+        result["points"] = points
+    return result
+
+
+def error_ellipsoids(P, centers=None, confidence=0.95, n_points=None):
+    """Confidence ellipsoids of a (B, 3, 3) stack of covariances (a single 3 x 3 also works)
+
+    Returns a dict of semi_axes (B, 3) lengths in descending order, axes (B, 3, 3) with the
+    matching unit axis in each column and volume (B,). When n_points is given "points" holds
+    (B, n_points, 3) boundary points (a Fibonacci lattice mapped onto each ellipsoid) around
+    centers (default the origin).
+    """
+    P = np.asarray(P, dtype=float)
+    eigenvalues, eigenvectors = np.linalg.eigh(P)
+    k = chi2_quantile(confidence, 3)
+    semi_axes = np.sqrt(k * np.maximum(eigenvalues[..., ::-1], 0))
+    axes = eigenvectors[..., ::-1]
+    result = {
+        "semi_axes": semi_axes,
+        "axes": axes,
+        "volume": (4 / 3) * np.pi * np.prod(semi_axes, axis=-1),
+    }
+    if n_points:
+        i = np.arange(n_points) + 0.5
+        z = 1 - 2 * i / n_points
+        azimuth = np.pi * (1 + 5**0.5) * i
+        ring = np.sqrt(1 - z**2)
+        sphere = np.stack([ring * np.cos(azimuth), ring * np.sin(azimuth), z], axis=-1)
+        points = (sphere * semi_axes[..., np.newaxis, :]) @ np.swapaxes(axes, -1, -2)
+        if centers is not None:
+            points += np.asarray(centers, dtype=float)[..., np.newaxis, :3]
+        result["points"] = points
+    return result
@@ -0,0 +1,112 @@
+import numpy as np
+from ils import IteratedLeastSquares
+
+SPEED_OF_LIGHT = 299_792_458.0
+
+
+class FrequencyOfArrival:
+    """Fused FOA model for a stationary emitter at an unknown position on K unknown carriers
+
+    Parameters are [x, y, z, f_0, ..., f_K-1] and measurement i was received on carrier
+    channels[i]. Sensor only terms (v . s) are computed once, each call then evaluates the
+    range geometry a single time and returns the predictions and the (N, 3 + K) jacobian
+    from it:
+
+    f_i = f_c (1 - rr_i / c),  rr_i = (v.s - v.x) / |s - x|
+    df_i/dx = -(f_c / c) drr_i/dx,  df_i/df_c = 1 - rr_i / c
+
+    The frequency columns are one-hot so measurements only couple to their own carrier.
+
+    Example Input and output
+    foa = FrequencyOfArrival(aircraft_position, aircraft_velocity, channels=channels)
+    result = foa.solve(initial_position, measurements, measurement_noise=np.array([sigma]),
+                       tol=1e-3, max_iterations=50)
+    position, frequencies = result.x_estimate[:3, 0], result.x_estimate[3:, 0]
+    """
+
+    def __init__(self, aircraft_position, aircraft_velocity, channels=None):
+        self.aircraft_position = np.asarray(aircraft_position, dtype=float)
+        self.aircraft_velocity = np.asarray(aircraft_velocity, dtype=float)
+        n = self.aircraft_position.shape[0]
+        if channels is None:
+            channels = np.zeros(n, dtype=int)
+        self.channels = np.asarray(channels, dtype=int).reshape(-1)
+        if self.channels.size != n:
+            raise ValueError("channels must assign one carrier to every measurement")
+        self.n_frequencies = int(self.channels.max()) + 1
+        self.v_dot_s = np.einsum(
+            "ni,ni->n", self.aircraft_velocity, self.aircraft_position
+        )
+        # (3, N) copies so every elementwise step runs along contiguous length N rows
+        self._position_rows = np.ascontiguousarray(self.aircraft_position.T)
+        self._velocity_rows = np.ascontiguousarray(self.aircraft_velocity.T)
+        self._rows = np.arange(n)
+
+    def __call__(self, parameter_estimate):
+        """Predicted frequencies (N,) and jacobian (N, 3 + K) from one geometry evaluation"""
+        parameter_estimate = np.asarray(parameter_estimate, dtype=float).reshape(-1)
+        position = parameter_estimate[:3]
+        line_of_sight = self._position_rows - position[:, np.newaxis]
+        norm = np.sqrt(np.einsum("in,in->n", line_of_sight, line_of_sight))
+        range_rate = self.v_dot_s - position @ self._velocity_rows
+        range_rate /= norm
+        partial_foa = 1 - range_rate / SPEED_OF_LIGHT
+        frequency = parameter_estimate[3:][self.channels]
+        predicted = frequency * partial_foa
+        # df/dx = (f / (c |s - x|)) (v - (s - x) rr / |s - x|)
+        H = np.empty((3 + self.n_frequencies, self._rows.size))
+        position_rows = H[:3]
+        np.multiply(line_of_sight, range_rate / norm, out=position_rows)
+        np.subtract(self._velocity_rows, position_rows, out=position_rows)
+        position_rows *= frequency / (SPEED_OF_LIGHT * norm)
+        if self.n_frequencies == 1:
+            H[3] = partial_foa
+        else:
+            H[3:] = 0
+            H[3 + self.channels, self._rows] = partial_foa
+        return predicted, H.T
+
+    def model(self, parameter_estimate):
+        """Predicted frequencies (N,)"""
+        return self(parameter_estimate)[0]
+
+    def jacobian(self, parameter_estimate):
+        """FOA jacobian (N, 3 + K)"""
+        return self(parameter_estimate)[1]
+
+    def initial_frequencies(self, measurements):
+        """Mean received frequency on each carrier, a seed for the unknown transmit frequencies"""
+        measurements = np.asarray(measurements, dtype=float).reshape(-1)
+        totals = np.bincount(self.channels, measurements, self.n_frequencies)
+        return totals / np.bincount(self.channels, minlength=self.n_frequencies)
+
+    def solve(
+        self,
+        initial_position,
+        measurements,
+        measurement_noise,
+        tol,
+        max_iterations,
+        initial_frequencies=None,
+        **kwargs,
+    ):
+        """Fit position and carriers with IteratedLeastSquares, returns its ILSResult
+
+        initial_frequencies defaults to initial_frequencies(measurements), other keyword
+        arguments (method, cost_tol, verbose, ...) are passed to IteratedLeastSquares.
+        """
+        if initial_frequencies is None:
+            initial_frequencies = self.initial_frequencies(measurements)
+        initial_parameters = np.concatenate(
+            [np.reshape(initial_position, -1)[:3], np.reshape(initial_frequencies, -1)]
+        )
+        obj = IteratedLeastSquares(
+            initial_parameters=initial_parameters[:, np.newaxis],
+            measurements=np.reshape(measurements, (-1, 1)),
+            measurement_noise=measurement_noise,
+            tol=tol,
+            max_iterations=max_iterations,
+            model_and_jacobian=self,
+            **kwargs,
+        )
+        return obj.solve_ils()
@@ -0,0 +1,188 @@
+import numpy as np
+import noise_models
+from ils import IteratedLeastSquares
+from ekf import ExtendedKalmanFilter
+from typing import Callable
+
+
+class Modality:
+    """One registered measurement type of a MeasurementFusion"""
+
+    def __init__(
+        self, name, model_and_jacobian, measurements, sigma, parameters, angular, args, kwargs
+    ):
+        self.name = name
+        self.model_and_jacobian = model_and_jacobian
+        self.measurements = measurements
+        self.sigma = sigma
+        self.parameters = parameters
+        self.angular = angular
+        self.args = args
+        self.kwargs = kwargs
+        self.rows = None
+        self.columns = None
+
+
+class MeasurementFusion:
+    """Stack several measurement types (TDOA, FOA, DOA, RR, ...) into one least squares problem
+
+    Every modality brings a fused model_and_jacobian, its measurements, its own noise and
+    the indices of the global parameters its local parameter vector is made of. Calling the
+    object evaluates each modality once on its slice of the global estimate and writes the
+    predictions and the jacobian block into preallocated (N,) and (N, n) buffers. Columns a
+    modality does not use are zero from allocation and never touched again, so e.g. the DOA
+    bias and FOA frequency only appear in their own rows. The buffers are reused by the next
+    call.
+
+    Per-iteration overhead is not constant in the number of modalities: nothing is
+    concatenated or allocated per call, but each modality is still one Python call and one
+    slice write. Modalities of the same type are not batched, register e.g. several range
+    rate passes as one modality with their sensor states stacked to keep the call count down.
+
+    Example Input and output
+    fusion = MeasurementFusion(n_parameters=5)  # [x, y, z, f, doa bias]
+    fusion.add("tdoa", jacobians.model_and_jacobian_range_difference, z_tdoa, sigma_tdoa,
+               [0, 1, 2], sensor_positions)
+    fusion.add("foa", jacobians.model_and_jacobian_foa, z_foa, sigma_foa,
+               [0, 1, 2, 3], aircraft_position, aircraft_velocity)
+    fusion.add("doa", jacobians.model_and_jacobian_doa_bias, z_doa, sigma_doa,
+               [0, 1, 4], sensor_location, angular=True)
+    result = fusion.solve(initial_parameters, tol=1e-3, max_iterations=50)
+    """
+
+    def __init__(self, n_parameters: int):
+        self.n_parameters = n_parameters
+        self.modalities = []
+        self._predicted = None
+        self._H = None
+
+    def add(
+        self,
+        name: str,
+        model_and_jacobian: Callable,
+        measurements: np.ndarray,
+        measurement_noise,
+        parameters,
+        *args,
+        angular: bool = False,
+        **kwargs,
+    ):
+        """Register a measurement type
+
+        Args:
+            name (str): label of the modality
+            model_and_jacobian (Callable): f(local_parameters, *args, **kwargs) -> (predicted, H)
+            measurements (np.ndarray): the modality's m measurements
+            measurement_noise: sigma, scalar or one per measurement
+            parameters: indices of the global parameters forming the local parameter vector
+            angular (bool): wrap residuals to (-pi, pi], for bearings
+        """
+        if not callable(model_and_jacobian):
+            raise ValueError("A fused model and jacobian is required")
+        measurements = np.asarray(measurements, dtype=float).reshape(-1)
+        sigma = np.broadcast_to(
+            np.asarray(measurement_noise, dtype=float).reshape(-1), measurements.shape
+        )
+        parameters = np.asarray(parameters, dtype=int).reshape(-1)
+        if parameters.size == 0:
+            raise ValueError(f"{name} uses no parameters")
+        if parameters.min() < 0 or parameters.max() >= self.n_parameters:
+            raise ValueError(f"{name} uses parameters outside 0..n_parameters - 1")
+        self.modalities.append(
+            Modality(
+                name, model_and_jacobian, measurements, sigma, parameters, angular, args, kwargs
+            )
+        )
+        self._predicted = self._H = None  # reallocate on the next call
+        return self
+
+    def _allocate(self):
+        """Assign each modality its rows and columns and allocate the stacked buffers"""
+        if not self.modalities:
+            raise ValueError("No measurement types registered")
+        start = 0
+        for modality in self.modalities:
+            stop = start + modality.measurements.size
+            modality.rows = slice(start, stop)
+            parameters = modality.parameters
+            contiguous = np.array_equal(
+                parameters, np.arange(parameters[0], parameters[0] + parameters.size)
+            )
+            modality.columns = (
+                slice(parameters[0], parameters[-1] + 1) if contiguous else parameters
+            )
+            start = stop
+        self._predicted = np.empty(start)
+        self._H = np.zeros((start, self.n_parameters))
+        self._measurements = np.concatenate(
+            [modality.measurements for modality in self.modalities]
+        )
+        self._sigma = np.concatenate([modality.sigma for modality in self.modalities])
+
+    @property
+    def measurements(self):
+        """All measurements stacked in registration order, as an N x 1 column"""
+        if self._H is None:
+            self._allocate()
+        return self._measurements[:, np.newaxis]
+
+    def noise_model(self):
+        """Diagonal noise model of the stacked measurements"""
+        if self._H is None:
+            self._allocate()
+        return noise_models.DiagonalNoise(self._sigma)
+
+    def __call__(self, parameter_estimate):
+        """Stacked predictions (N,) and block sparse jacobian (N, n) at a global estimate"""
+        if self._H is None:
+            self._allocate()
+        parameter_estimate = np.asarray(parameter_estimate, dtype=float).reshape(-1)
+        for modality in self.modalities:
+            predicted, H = modality.model_and_jacobian(
+                parameter_estimate[modality.parameters], *modality.args, **modality.kwargs
+            )
+            predicted = np.reshape(predicted, -1)
+            if modality.angular:
+                # shift each bearing to within pi of its measurement so z - h is wrapped
+                offset = modality.measurements - predicted
+                predicted = predicted + (offset - ((offset + np.pi) % (2 * np.pi) - np.pi))
+            self._predicted[modality.rows] = predicted
+            self._H[modality.rows, modality.columns] = np.reshape(
+                H, (predicted.size, -1)
+            )
+        return self._predicted, self._H
+
+    def model(self, parameter_estimate):
+        """Stacked predictions (N,)"""
+        return self(parameter_estimate)[0].copy()
+
+    def jacobian(self, parameter_estimate):
+        """Stacked block sparse jacobian (N, n)"""
+        return self(parameter_estimate)[1].copy()
+
+    def solve(self, initial_parameters, tol, max_iterations, **kwargs):
+        """Fit every modality jointly with IteratedLeastSquares, returns its ILSResult
+
+        Keyword arguments (method, cost_tol, verbose, ...) are passed to IteratedLeastSquares.
+        """
+        obj = IteratedLeastSquares(
+            initial_parameters=np.reshape(initial_parameters, (-1, 1)),
+            measurements=self.measurements,
+            measurement_noise=self.noise_model(),
+            tol=tol,
+            max_iterations=max_iterations,
+            model_and_jacobian=self,
+            **kwargs,
+        )
+        return obj.solve_ils()
+
+    def ekf(self, initial_parameters, initial_covariance, confidence):
+        """ExtendedKalmanFilter over the stacked measurements, call solve_ekf() to update"""
+        return ExtendedKalmanFilter(
+            initial_parameters=np.reshape(initial_parameters, -1).astype(float),
+            initial_covariance=initial_covariance,
+            measurement=self.measurements[:, 0],
+            sensor_noise=self.noise_model(),
+            confidence=confidence,
+            model_and_jacobian=self,
+        )
@@ -0,0 +1,162 @@
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# OrderedDict slot and link node plus the stored (value, size) pair of one entry, sized so
+# the charged bytes of many small site entries match their traced memory
+ENTRY_OVERHEAD = 144
+_ARRAY_HEADER = sys.getsizeof(np.empty(0))
+
+
+def content_key(*arrays):
+    """Hash of the shapes, dtypes and contents of arrays, usable as a track id
+
+    Hashing reads every byte once, so it pays off for arrays whose derived geometry is
+    reused many times (the same ephemeris scored against many emitter hypotheses).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.shape}{array.dtype.str}".encode())
+        digest.update(array.data)
+    return digest.hexdigest()
+
+
+def nbytes(value):
+    """Bytes held by an array or a tuple of arrays, the array objects included"""
+    if isinstance(value, tuple):
+        return sys.getsizeof(value) + sum(nbytes(item) for item in value)
+    return np.asarray(value).nbytes + _ARRAY_HEADER
+
+
+def key_bytes(key):
+    """Bytes held by a cache key and the tuples, strings and numbers inside it"""
+    if isinstance(key, tuple):
+        return sys.getsizeof(key) + sum(key_bytes(part) for part in key)
+    return sys.getsizeof(key)
+
+
+def _read_only(value):
+    if isinstance(value, tuple):
+        return tuple(_read_only(item) for item in value)
+    value = np.asarray(value)
+    value.setflags(write=False)
+    return value
+
+
+class GeometryCache:
+    """Bounded LRU cache of geometry derived from fixed sensors and sensor tracks
+
+    Entries are keyed by (kind, identity), where identity is a site tuple such as
+    (lat, lon, alt), a caller chosen track id or a content_key of the source arrays. A
+    track id promises its arrays never change, the contents are not checked on lookup, so
+    a track whose arrays are edited or replaced (e.g. the next micro-batch of a stream)
+    must be evict()ed first or passed under a new id such as (name, version). Cached
+    arrays are stored read only. An entry is charged its array data, the array and key
+    objects and ENTRY_OVERHEAD for the dict bookkeeping, so max_bytes bounds the memory the
+    cache holds even for many small site entries. Once the charged bytes exceed max_bytes
+    the least recently used entries are evicted, values larger than the whole budget are
+    returned uncached. Every operation holds a lock so the cache can be shared with
+    executor threads, compute() runs outside it.
+
+    Example Input and output
+    cache = GeometryCache(max_bytes=256 * 2**20)
+    v_dot_s = cache.get(("v_dot_s", "pass_0412"), lambda: np.einsum("ni,ni->n", v, s))
+    cache.evict("pass_0412")  # drop every entry of the track
+    cache.stats()
+    {'hits': 41, 'misses': 1, 'evictions': 0, 'entries': 1, 'bytes': 80000, 'max_bytes': 268435456}
+    """
+
+    def __init__(self, max_bytes: int = 64 * 2**20):
+        if max_bytes < 0:
+            raise ValueError("max_bytes must be non negative")
+        self.max_bytes = int(max_bytes)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, compute, check=None):
+        """Cached value of key, computed with compute() and stored on a miss
+
+        check, e.g. a content_key() of the source arrays, is stored with the value and an
+        entry stored with a different check is recomputed and replaced.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] == check:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        value = _read_only(compute())
+        size = nbytes(value) + key_bytes(key) + key_bytes(check) + ENTRY_OVERHEAD
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[2] == check:  # another thread stored it while we computed
+                    return entry[0]
+                self.bytes -= self._entries.pop(key)[1]  # stale, the source changed
+                self.evictions += 1
+            if size <= self.max_bytes:
+                self._entries[key] = (value, size, check)
+                self.bytes += size
+                self._shrink(self.max_bytes)
+        return value
+
+    def _shrink(self, max_bytes):
+        while self.bytes > max_bytes:
+            _, (_, size, _) = self._entries.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def evict(self, identity):
+        """Remove every entry whose key is identity or whose (kind, identity) key names it"""
+        with self._lock:
+            for key in [
+                key
+                for key in self._entries
+                if key == identity or (isinstance(key, tuple) and key[1:] == (identity,))
+            ]:
+                self.bytes -= self._entries.pop(key)[1]
+                self.evictions += 1
+
+    def resize(self, max_bytes: int):
+        """Change the budget, evicting least recently used entries down to it"""
+        if max_bytes < 0:
+            raise ValueError("max_bytes must be non negative")
+        with self._lock:
+            self.max_bytes = int(max_bytes)
+            self._shrink(self.max_bytes)
+
+    def clear(self):
+        """Drop every entry and reset the statistics"""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# shared by coordinate_transforms, model_equations and grid_search,
+# size it with DEFAULT_CACHE.resize(max_bytes)
+DEFAULT_CACHE = GeometryCache()
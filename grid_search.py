@@ -0,0 +1,220 @@
+import numpy as np
+import noise_models
+from model_equations import range_rate_sensor_terms
+from coordinate_transforms import LocalFrame, geodetic_to_ecef
+from typing import Callable
+
+
+class RangeRateGeometry:
+    """Sensor terms of the range rate model that do not change between candidate emitters
+
+    range rate = v . (s - x) / |s - x| = (v.s - v.x) / sqrt(|s|^2 - 2 s.x + |x|^2)
+
+    v.s and |s|^2 are computed once, or taken from geometry_cache.DEFAULT_CACHE when a
+    track_id names the ephemeris, scoring a (G, 3) set of candidates is then two
+    (G, 3) @ (3, N) products. Calling the object returns (G, N) predicted range rates.
+
+    With an origin (ECEF, e.g. the centre of the search area) the sensor positions and
+    candidates are recentred on it in float64 before they are cast to dtype, so
+    dtype=np.float32 halves the memory traffic of scoring without the cancellation
+    |s|^2 - 2 s.x + |x|^2 would suffer at ECEF magnitudes. The recentred terms depend on
+    the origin and are not cached under track_id.
+    """
+
+    def __init__(
+        self,
+        sat_position: np.ndarray,
+        sat_velocity: np.ndarray,
+        track_id=None,
+        origin: np.ndarray = None,
+        dtype=np.float64,
+    ):
+        self.dtype = np.dtype(dtype)
+        if origin is None and self.dtype != np.float64:
+            raise ValueError("reduced precision scoring needs a local origin")
+        sat_position = np.asarray(sat_position, dtype=float)
+        sat_velocity = np.asarray(sat_velocity, dtype=float)
+        if origin is None:
+            self.origin = None
+            v_dot_s, s_squared = range_rate_sensor_terms(
+                sat_position, sat_velocity, track_id
+            )
+        else:
+            self.origin = np.asarray(origin, dtype=float).reshape(3)
+            sat_position = sat_position - self.origin
+            v_dot_s, s_squared = range_rate_sensor_terms(sat_position, sat_velocity)
+        self.sat_position = sat_position.astype(self.dtype, copy=False)
+        self.sat_velocity = sat_velocity.astype(self.dtype, copy=False)
+        self.v_dot_s = v_dot_s.astype(self.dtype, copy=False)
+        self.s_squared = s_squared.astype(self.dtype, copy=False)
+
+    def __call__(self, candidates: np.ndarray):
+        candidates = np.atleast_2d(candidates)
+        if self.origin is not None:
+            candidates = np.subtract(
+                candidates, self.origin, out=np.empty(candidates.shape, self.dtype)
+            )
+        x_squared = np.einsum("gi,gi->g", candidates, candidates)[:, np.newaxis]
+        norm = candidates @ self.sat_position.T
+        norm *= -2
+        norm += self.s_squared
+        norm += x_squared
+        np.sqrt(norm, out=norm)
+        range_rate = candidates @ self.sat_velocity.T
+        np.subtract(self.v_dot_s, range_rate, out=range_rate)
+        range_rate /= norm
+        return range_rate
+
+
+class GridSearch:
+    """Coarse to fine grid search used to seed IteratedLeastSquares
+
+    Example Input and output
+    search = GridSearch(model=RangeRateGeometry(sat_position, sat_velocity),
+                        measurements=z,
+                        measurement_noise=np.array([sigma]))
+    seeds, costs = search.search_geodetic(lat_bounds=(30, 40), lon_bounds=(-80, -70), n_seeds=3)
+
+    obj = IteratedLeastSquares(initial_parameters=seeds[0][:, np.newaxis], ...)
+    """
+
+    def __init__(
+        self,
+        model: Callable,
+        measurements: np.ndarray,
+        measurement_noise: np.ndarray,
+        chunk_elements: int = 262_144,
+    ):
+        """
+        Args:
+            model (Callable): maps (G, 3) ECEF candidates to (G, N) predicted measurements
+            measurements (np.ndarray): N measurements (any shape with N elements)
+            measurement_noise (np.ndarray): sigma, per measurement sigmas or covariance
+            chunk_elements (int): upper bound on G x N evaluated at once to cap memory
+        """
+        if not callable(model):
+            raise ValueError("A model equation is required")
+        self.model = model
+        self.measurements = np.asarray(measurements, dtype=float).reshape(-1)
+        self.noise = noise_models.as_noise_model(
+            measurement_noise, self.measurements.size
+        )
+        self.chunk_elements = chunk_elements
+
+    def score(self, candidates: np.ndarray):
+        """Weighted sum of squared residuals for each (G, 3) ECEF candidate"""
+        candidates = np.atleast_2d(candidates)
+        costs = np.empty(candidates.shape[0])
+        chunk = max(1, self.chunk_elements // max(1, self.measurements.size))
+        measurements = self.measurements
+        for start in range(0, candidates.shape[0], chunk):
+            residuals = self.model(candidates[start : start + chunk])
+            if residuals.dtype != measurements.dtype:  # e.g. float32 model, cast z once
+                measurements = self.measurements.astype(residuals.dtype)
+            np.subtract(measurements, residuals, out=residuals)
+            residuals = self.noise.whiten(residuals.T)
+            # float32 models still sum N squares per candidate, carry the sums in float64
+            costs[start : start + chunk] = np.einsum(
+                "ng,ng->g", residuals, residuals, dtype=np.float64
+            )
+        return costs
+
+    def _search(
+        self, to_ecef, bounds_u, bounds_v, shape, refine_shape, levels, keep, n_seeds
+    ):
+        """Hierarchical search over a 2D (u, v) parameterisation of candidate positions
+
+        Level 0 scores a shape[0] x shape[1] grid over the bounds. Every later level scores
+        a refine_shape grid spanning +/- one parent cell around each of the keep best cells,
+        so the resolution improves by (refine_shape - 1) / 2 per level.
+        """
+        spacing_u = (bounds_u[1] - bounds_u[0]) / (shape[0] - 1)
+        spacing_v = (bounds_v[1] - bounds_v[0]) / (shape[1] - 1)
+        offsets_u = np.linspace(-1, 1, refine_shape[0])
+        offsets_v = np.linspace(-1, 1, refine_shape[1])
+        u, v = np.meshgrid(
+            np.linspace(*bounds_u, shape[0]), np.linspace(*bounds_v, shape[1]),
+            indexing="ij",
+        )
+        u, v = u.reshape(-1), v.reshape(-1)
+        for level in range(levels):
+            candidates = to_ecef(u, v)
+            costs = self.score(candidates)
+            best = np.argsort(costs)[: max(keep, n_seeds)]
+            if level == levels - 1:
+                best = best[:n_seeds]
+                return candidates[best], costs[best]
+            centers_u, centers_v = u[best[:keep]], v[best[:keep]]
+            window_u, window_v = np.meshgrid(
+                offsets_u * spacing_u, offsets_v * spacing_v, indexing="ij"
+            )
+            u = (centers_u[:, np.newaxis] + window_u.reshape(-1)).reshape(-1)
+            v = (centers_v[:, np.newaxis] + window_v.reshape(-1)).reshape(-1)
+            spacing_u *= 2 / (refine_shape[0] - 1)
+            spacing_v *= 2 / (refine_shape[1] - 1)
+            # windows of neighbouring cells overlap on the same lattice, score each point once
+            lattice = np.column_stack(
+                [
+                    np.round((u - bounds_u[0]) / spacing_u),
+                    np.round((v - bounds_v[0]) / spacing_v),
+                ]
+            )
+            _, unique = np.unique(lattice, axis=0, return_index=True)
+            u, v = u[unique], v[unique]
+
+    def search_geodetic(
+        self,
+        lat_bounds,
+        lon_bounds,
+        altitude=0.0,
+        shape=(50, 50),
+        refine_shape=(11, 11),
+        levels=4,
+        keep=8,
+        n_seeds=1,
+    ):
+        """Search a lat/lon grid (degrees) at a fixed altitude (HAE, meters)
+
+        Returns the n_seeds best ECEF positions (n_seeds, 3) and their costs.
+        """
+
+        def to_ecef(lat, lon):
+            return geodetic_to_ecef(lat, lon, altitude).T
+
+        return self._search(
+            to_ecef, lat_bounds, lon_bounds, shape, refine_shape, levels, keep, n_seeds
+        )
+
+    def search_topocentric(
+        self,
+        east_bounds,
+        north_bounds,
+        observer_latitude,
+        observer_longitude,
+        observer_altitude=0.0,
+        up=0.0,
+        shape=(50, 50),
+        refine_shape=(11, 11),
+        levels=4,
+        keep=8,
+        n_seeds=1,
+    ):
+        """Search an east/north grid (meters) around an observer at a fixed up offset
+
+        Returns the n_seeds best ECEF positions (n_seeds, 3) and their costs.
+        """
+        site = LocalFrame(observer_latitude, observer_longitude, observer_altitude)
+
+        def to_ecef(east, north):
+            return site.to_ecef(np.column_stack([east, north, np.full(east.shape, up)]))
+
+        return self._search(
+            to_ecef,
+            east_bounds,
+            north_bounds,
+            shape,
+            refine_shape,
+            levels,
+            keep,
+            n_seeds,
+        )
@@ -1,7 +1,50 @@
+import logging
 import numpy as np
 import scipy
+import model_equations
+import noise_models
+from instrumentation import DISABLED
 from typing import Callable
 
+logger = logging.getLogger(__name__)
+
+
+class ILSResult:
+    """Outcome of IteratedLeastSquares.solve_ils, returned on success and on failure
+
+    Unpacks as (x_estimate, P) so x_estimate, P = obj.solve_ils(...) keeps working.
+
+    Attributes:
+        x_estimate (np.ndarray): final n x 1 parameter estimate
+        P (np.ndarray): n x n estimation error covariance linearized at x_estimate
+        converged (bool): True when a step size or relative cost criterion was met
+        iterations (int): number of jacobian evaluations (accepted and rejected steps)
+        cost_history (np.ndarray): whitened sum of squared residuals of every accepted estimate
+        condition_number (float): condition number of the final information matrix H^T R^-1 H
+        message (str): reason the solver stopped
+    """
+
+    def __init__(
+        self, x_estimate, P, converged, iterations, cost_history, condition_number, message
+    ):
+        self.x_estimate = x_estimate
+        self.P = P
+        self.converged = converged
+        self.iterations = iterations
+        self.cost_history = np.asarray(cost_history, dtype=float)
+        self.condition_number = condition_number
+        self.message = message
+
+    def __iter__(self):
+        return iter((self.x_estimate, self.P))
+
+    def __repr__(self):
+        return (
+            f"ILSResult(converged={self.converged}, iterations={self.iterations}, "
+            f"cost={self.cost_history[-1]:.6g}, condition_number={self.condition_number:.3g}, "
+            f"message={self.message!r})"
+        )
+
 
 class IteratedLeastSquares:
     """Solve nonlinear least squares problem
@@ -18,8 +61,16 @@ class IteratedLeastSquares:
     x_estimate, P = obj.solve_ils(t, u , y_naught)
 
     print(np.round(x_estimate, 5).item(), np.round(np.sqrt(P),5).item())
-    Converged to a solution in 4 iterations
     0.16815 0.00296
+
+    method="levenberg-marquardt" damps each step and rejects steps which increase the
+    cost, which avoids the oscillation of plain Gauss-Newton on poor (e.g. nearly
+    collinear) geometry. solve_ils returns an ILSResult with the cost history, iteration
+    count and condition number whether or not it converged.
+
+    model_and_jacobian may replace model and linearized_model with one callable returning
+    (predicted, H) from a single evaluation of the shared geometry, e.g.
+    jacobians.model_and_jacobian_foa, so each iteration costs one call.
     """
 
     def __init__(
@@ -29,29 +80,61 @@ class IteratedLeastSquares:
         measurement_noise: np.ndarray,
         tol: float,
         max_iterations: int,
-        model: Callable,
-        linearized_model: Callable,
+        model: Callable = None,
+        linearized_model: Callable = None,
+        method: str = "gauss-newton",
+        cost_tol: float = None,
+        damping: float = 1e-3,
+        max_damping: float = 1e10,
+        verbose: bool = False,
+        model_and_jacobian: Callable = None,
+        instrumentation=None,
     ):
+        """
+        Args:
+            tol (float): converged when the step norm drops below tol
+            method (str): "gauss-newton" or "levenberg-marquardt"
+            cost_tol (float): also converged when an accepted step lowers the cost by less than this fraction
+            damping (float): initial Levenberg-Marquardt damping, scaled by 10 on every rejected/accepted step
+            max_damping (float): give up once the damping grows past this without an accepted step
+            verbose (bool): log the convergence message at INFO instead of DEBUG
+            model_and_jacobian (Callable): fused h(x) and H, used instead of model and linearized_model
+            instrumentation (SolverInstrumentation): per iteration phase timings and metrics, off by default
+        """
 
         self.initial_parameters = initial_parameters
         self.measurement_noise = measurement_noise
         self.tol = tol
         self.max_iterations = max_iterations
         self.measurements = measurements
-        if not callable(model):
-            raise ValueError("A model equation is required")
-        if not callable(linearized_model):
-            raise ValueError("A linearized model is required")
+        if model_and_jacobian is not None:
+            if not callable(model_and_jacobian):
+                raise ValueError("A fused model and jacobian must be callable")
+        else:
+            if not callable(model):
+                raise ValueError("A model equation is required")
+            if not callable(linearized_model):
+                raise ValueError("A linearized model is required")
+        if method not in ("gauss-newton", "levenberg-marquardt"):
+            raise ValueError(f"Unknown method {method!r}")
 
         self.model = model
         self.linearized_model = linearized_model
+        self.model_and_jacobian = model_and_jacobian
+        self.method = method
+        self.cost_tol = cost_tol
+        self.damping = damping
+        self.max_damping = max_damping
+        self.verbose = verbose
+        self.instrumentation = instrumentation
 
     def model_equation(self, *args, **kwargs):
         """Provided Model equation h(x_current) [Mathematical model of the measurement]
 
         Given an initial or currrent parameter vector return the predicted parameters (x^hat)
         """
-
+        if self.model is None:
+            return self.model_and_jacobian(*args, **kwargs)[0]
         return self.model(*args, **kwargs)
 
     def jacobian(self, *args, **kwargs):
@@ -59,59 +142,514 @@ class IteratedLeastSquares:
 
         Returns: A jacobian matrix H
         """
+        if self.linearized_model is None:
+            return self.model_and_jacobian(*args, **kwargs)[1]
         return self.linearized_model(*args, **kwargs)
 
+    def noise_model(self):
+        """Scalar, diagonal or dense noise model for the current measurements"""
+        return noise_models.as_noise_model(
+            self.measurement_noise, self.measurements.size
+        )
+
     def measurement_error_covariance(self):
         n = self.measurements.size  # or len(self.measurements)
-        return np.eye(n) * (self.measurement_noise**2)
+        return self.noise_model().covariance(n)
 
     def covariance_matrix_P(self, H: np.ndarray):
         """Estimation error covariance matrix"""
-        R = (
-            self.measurement_error_covariance()
-        )  # measurement error covariance matrix (positive definite)
-        R_inv = np.linalg.pinv(R)
-        P = np.linalg.pinv(H.T @ R_inv @ H)
+        H_white = self.noise_model().whiten(H)  # R^-1/2 H, R is never inverted
+        _, P = noise_models.solve_normal_equations(
+            H_white, np.zeros((H.shape[0], 1))
+        )
         return P
 
     def iteration(self, x_current, measurements, *args, **kwargs):
         predicted = self.model_equation(x_current, *args, **kwargs)
-        residuals = measurements - predicted[:, np.newaxis]
+        residuals = measurements - predicted.reshape(-1, 1)
         H = self.jacobian(x_current, *args, **kwargs)
-        P = self.covariance_matrix_P(H)
-        R = self.measurement_error_covariance()  # sensor noise
-        R_inv = np.linalg.pinv(R)
-        K = P @ H.T @ R_inv
-        correction_term = K @ residuals  # gauss-markov solution
+        noise = self.noise_model()
+        correction_term, P = noise_models.solve_normal_equations(
+            noise.whiten(H), noise.whiten(residuals)
+        )  # gauss-markov solution
         x_hat = (
             x_current + correction_term
         )  # current parameter estimate + correction term = x_estimate
         return x_hat, P
 
+    def whitened_residuals(self, x_current, noise, *args, **kwargs):
+        """R^-1/2 (z - h(x)) as an N x 1 column"""
+        predicted = self.model_equation(x_current, *args, **kwargs)
+        return noise.whiten(self.measurements - predicted.reshape(-1, 1))
+
+    def whitened_system(self, x_current, noise, *args, **kwargs):
+        """Whitened residuals and, with a fused model_and_jacobian, the whitened H (else None)"""
+        if self.model_and_jacobian is None:
+            return self.whitened_residuals(x_current, noise, *args, **kwargs), None
+        predicted, H = self.model_and_jacobian(x_current, *args, **kwargs)
+        residuals = self.measurements - predicted.reshape(-1, 1)
+        return noise.whiten(residuals), noise.whiten(H)
+
     def solve_ils(self, *args, **kwargs):
-        """Returns estimated parameter and covariance"""
+        """Returns an ILSResult, unpackable as (x_estimate, P)
+
+        A model or jacobian that turns NaN or inf stops the solve with converged False at
+        the last finite estimate (P is NaN when the jacobian there is not finite),
+        Levenberg-Marquardt rejects such a step and raises the damping instead.
+        """
+        probe = self.instrumentation or DISABLED
+        model_phase = "model" if self.model_and_jacobian is None else "model_and_jacobian"
+        noise = self.noise_model()
+        lm = self.method == "levenberg-marquardt"
+        damping = self.damping if lm else 0.0
         x_current = self.initial_parameters.copy()
-        for iter in range(self.max_iterations):
-            x_estimate, P = self.iteration(
-                x_current, self.measurements, *args, **kwargs
+        start = probe.clock()
+        residuals_white, H_white = self.whitened_system(
+            x_current, noise, *args, **kwargs
+        )
+        probe.phase(model_phase, start)
+        cost = (residuals_white.T @ residuals_white).item()
+        cost_history = [cost]
+        converged = False
+        message = f"Failed to converage after {self.max_iterations} iterations."
+        iteration = 0
+        max_iterations = self.max_iterations
+        if not np.isfinite(cost):
+            message = "The model is not finite at the initial estimate."
+            max_iterations = 0
+        for iteration in range(1, max_iterations + 1):
+            start = probe.clock()
+            if H_white is None:  # only relinearize after an accepted step
+                H_white = noise.whiten(self.jacobian(x_current, *args, **kwargs))
+                start = probe.phase("jacobian", start)
+            try:
+                correction_term, _ = noise_models.solve_normal_equations(
+                    H_white, residuals_white, damping
+                )
+            except ValueError:  # the jacobian is not finite at x_current
+                message = (
+                    f"The jacobian is not finite after {iteration - 1} iterations."
+                )
+                break
+            start = probe.phase("solve", start)
+            x_estimate = x_current + correction_term
+            step = np.linalg.norm(correction_term)
+            new_residuals, new_H_white = self.whitened_system(
+                x_estimate, noise, *args, **kwargs
+            )
+            new_cost = (new_residuals.T @ new_residuals).item()
+            finite = np.isfinite(new_cost) and (
+                new_H_white is None or np.isfinite(new_H_white).all()
+            )
+            probe.phase(model_phase, start)
+            if probe.enabled:
+                probe.end_iteration(
+                    "ils",
+                    iteration=iteration,
+                    residual_norm=np.sqrt(new_cost),
+                    step_norm=step,
+                    condition_number=np.linalg.cond(
+                        noise_models.normal_equations(H_white)[0]
+                    ),
+                    accepted=finite and not (lm and not new_cost < cost),
+                    damping=damping,
+                )
+            if not finite and not lm:
+                message = f"Step to a non-finite cost after {iteration} iterations."
+                break
+            if not finite or (lm and not new_cost < cost):
+                damping *= 10  # reject, shorten the step towards gradient descent
+                if damping > self.max_damping:
+                    message = (
+                        f"Step rejected with damping above {self.max_damping:g} "
+                        f"after {iteration} iterations."
+                    )
+                    break
+                continue
+            relative_decrease = (cost - new_cost) / cost if cost > 0 else 0.0
+            x_current, residuals_white, cost = x_estimate, new_residuals, new_cost
+            cost_history.append(cost)
+            H_white = new_H_white  # None without a fused model, relinearized on demand
+            if lm:
+                damping /= 10
+            if step < self.tol:
+                converged = True
+                message = f"Converged to a solution in {iteration} iterations"
+                break
+            if self.cost_tol is not None and 0 <= relative_decrease < self.cost_tol:
+                converged = True
+                message = f"Converged on relative cost in {iteration} iterations"
+                break
+        start = probe.clock()
+        if H_white is None:  # P at the final estimate, as the fused path already has it
+            H_white = noise.whiten(self.jacobian(x_current, *args, **kwargs))
+        information, _ = noise_models.normal_equations(H_white)
+        if np.isfinite(information).all():
+            condition_number = np.linalg.cond(information)
+            _, P = noise_models.solve_information(
+                information, np.zeros((information.shape[0], 1))
+            )
+        else:  # x_current is a singularity of the jacobian, e.g. on a sensor
+            condition_number = np.inf
+            P = np.full_like(information, np.nan)
+        probe.phase("covariance", start)
+        probe.end_solve("ils", converged=converged)
+        logger.log(logging.INFO if self.verbose else logging.DEBUG, message)
+        return ILSResult(
+            x_current,
+            P,
+            converged,
+            iteration,
+            cost_history,
+            condition_number,
+            message,
+        )
+
+
+class BatchedIteratedLeastSquares:
+    """Solve B independent nonlinear least squares problems at once
+
+    Every problem shares the same number of measurements and parameters so the
+    Gauss-Newton step can be taken for the whole stack with batched linear algebra.
+    The model and linearized model must accept stacked parameters of shape (B, n)
+    followed by any (B, ...) geometry arrays and return (B, N) predictions and a
+    (B, N, n) jacobian respectively.
+
+    Example Input and output
+    obj = BatchedIteratedLeastSquares(initial_parameters=x_naught [(B, n)],
+                                      measurements=z [(B, N)],
+                                      measurement_noise=sigma [scalar, (B,) or (B, N)],
+                                      tol=1e-3,
+                                      max_iterations=50,
+                                      model=h_model [Callable],
+                                      linearized_model=jac_matrix [Callable])
+
+    x_estimate, P, iterations, converged = obj.solve_ils(sat_position, sat_velocity)
+    """
+
+    def __init__(
+        self,
+        initial_parameters: np.ndarray,
+        measurements: np.ndarray,
+        measurement_noise: np.ndarray,
+        tol: float,
+        max_iterations: int,
+        model: Callable,
+        linearized_model: Callable,
+    ):
+
+        self.initial_parameters = np.atleast_2d(initial_parameters)
+        self.measurements = np.atleast_2d(measurements)
+        if self.initial_parameters.shape[0] != self.measurements.shape[0]:
+            raise ValueError(
+                "initial_parameters and measurements must share the batch axis"
+            )
+        self.measurement_noise = measurement_noise
+        self.tol = tol
+        self.max_iterations = max_iterations
+        if not callable(model):
+            raise ValueError("A model equation is required")
+        if not callable(linearized_model):
+            raise ValueError("A linearized model is required")
+
+        self.model = model
+        self.linearized_model = linearized_model
+
+    def model_equation(self, *args, **kwargs):
+        """Provided batched model equation h(x_current), returns (B, N) predictions"""
+        return self.model(*args, **kwargs)
+
+    def jacobian(self, *args, **kwargs):
+        """Provided batched jacobian of the model equation, returns (B, N, n)"""
+        return self.linearized_model(*args, **kwargs)
+
+    def measurement_weights(self):
+        """Inverse measurement variances broadcast to (B, N)
+
+        Measurements are IID and uncorrelated so R is diagonal and R^-1 is just the
+        reciprocal of the variances, no N x N matrix is ever formed.
+        """
+        sigma = np.asarray(self.measurement_noise, dtype=float)
+        if sigma.ndim == 1 and sigma.size == self.measurements.shape[0]:
+            sigma = sigma[:, np.newaxis]
+        return np.broadcast_to(1.0 / sigma**2, self.measurements.shape)
+
+    def iteration(self, x_current, measurements, weights, *args, **kwargs):
+        predicted = self.model_equation(x_current, *args, **kwargs)
+        residuals = measurements - predicted
+        H = self.jacobian(x_current, *args, **kwargs)
+        HtW = np.swapaxes(H * weights[:, :, np.newaxis], 1, 2)  # H.T @ R^-1
+        information = HtW @ H
+        P = np.linalg.pinv(information, hermitian=True)
+        correction_term = (P @ (HtW @ residuals[:, :, np.newaxis]))[:, :, 0]
+        return x_current + correction_term, P
+
+    def solve_ils(self, *args, **kwargs):
+        """Returns estimated parameters, covariances, iteration counts and convergence flags
+
+        Positional arguments are sliced along their first axis so only the problems
+        which have not yet converged are evaluated on each iteration.
+        """
+        x_current = self.initial_parameters.astype(float)
+        batch_size, n = x_current.shape
+        weights = self.measurement_weights()
+        P = np.full((batch_size, n, n), np.nan)
+        iterations = np.zeros(batch_size, dtype=int)
+        converged = np.zeros(batch_size, dtype=bool)
+        active = np.arange(batch_size)
+        for _ in range(self.max_iterations):
+            if active.size == 0:
+                break
+            active_args = [np.asarray(arg)[active] for arg in args]
+            x_estimate, P_active = self.iteration(
+                x_current[active],
+                self.measurements[active],
+                weights[active],
+                *active_args,
+                **kwargs,
             )
-            if np.linalg.norm(x_estimate - x_current) < self.tol:
-                print(f"Converged to a solution in {iter + 1} iterations")
+            step = np.linalg.norm(x_estimate - x_current[active], axis=1)
+            x_current[active] = x_estimate
+            P[active] = P_active
+            iterations[active] += 1
+            done = step < self.tol
+            converged[active[done]] = True
+            active = active[~done]
+
+        return x_current, P, iterations, converged
+
+
+class SlidingWindowLeastSquares:
+    """Nonlinear least squares over the most recent window_size samples, updated incrementally
+
+    The window keeps the whitened jacobian rows and residuals of every sample, linearized
+    at a common point x_lin, and their sums H^T R^-1 H and H^T R^-1 r. An update subtracts
+    the terms of the samples that leave the window, adds those of the new samples and
+    solves the n x n system for x = x_lin + (H^T R^-1 H)^-1 H^T R^-1 r, so its cost scales
+    with the number of samples that changed. Only when the estimate moves more than tol
+    from x_lin is the whole window relinearized at the new estimate (Gauss-Newton warm
+    started from the previous solution, at most max_iterations times per update), a
+    relinearization that raises the cost is undone and the previous estimate kept. The sums
+    are rebuilt from the stored rows after every window_size evictions so rounding from
+    the running additions and subtractions does not accumulate.
+
+    A sample is one row of the sensor state arrays and may carry k measurements, e.g. a
+    range rate (k = 1) or the k = N - 1 range differences of N sensors at one epoch. The
+    model and linearized model (or model_and_jacobian) take the estimate followed by the
+    (m, ...) sensor state of m samples and return (m,) or (m, k) predictions and an
+    (m, n) or (m, k, n) jacobian.
+
+    Example Input and output
+    obj = SlidingWindowLeastSquares(initial_parameters=np.array([x_naught])[:, np.newaxis],
+                                    window_size=2000,
+                                    measurement_noise=np.array([sigma]),
+                                    tol=1.0,
+                                    max_iterations=10,
+                                    model=model_equations.model_equation_rr,
+                                    linearized_model=jacobians.range_rate_jacobian)
+    for z, sat_position, sat_velocity in feed:
+        x_estimate, P = obj.update(z, sat_position, sat_velocity)
+    """
+
+    def __init__(
+        self,
+        initial_parameters: np.ndarray,
+        window_size: int,
+        measurement_noise: np.ndarray,
+        tol: float,
+        max_iterations: int,
+        model: Callable = None,
+        linearized_model: Callable = None,
+        model_and_jacobian: Callable = None,
+        min_samples: int = None,
+    ):
+        """
+        Args:
+            window_size (int): number of most recent samples in the fit
+            measurement_noise (np.ndarray): default sigma, one shared or one per measurement of a sample
+            tol (float): relinearize the window once the estimate moves more than tol from x_lin
+            max_iterations (int): relinearizations allowed per update
+            model_and_jacobian (Callable): fused h(x) and H, used instead of model and linearized_model
+            min_samples (int): samples accumulated before the first solve, defaults to a full window
+        """
+        if window_size < 1:
+            raise ValueError("window_size must be positive")
+        if min_samples is None:
+            min_samples = window_size
+        if not 1 <= min_samples <= window_size:
+            raise ValueError("min_samples must be between 1 and window_size")
+        if model_and_jacobian is not None:
+            if not callable(model_and_jacobian):
+                raise ValueError("A fused model and jacobian must be callable")
+        else:
+            if not callable(model):
+                raise ValueError("A model equation is required")
+            if not callable(linearized_model):
+                raise ValueError("A linearized model is required")
+        self.x_estimate = np.asarray(initial_parameters, dtype=float).reshape(-1, 1)
+        self.x_lin = self.x_estimate.copy()
+        self.window_size = int(window_size)
+        self.measurement_noise = measurement_noise
+        self.tol = tol
+        self.max_iterations = max_iterations
+        self.model = model
+        self.linearized_model = linearized_model
+        self.model_and_jacobian = model_and_jacobian
+        self.min_samples = int(min_samples)
+        n = self.x_estimate.shape[0]
+        self.information = np.zeros((n, n))
+        self.gradient = np.zeros((n, 1))
+        self.P = np.full((n, n), np.inf)
+        self.count = 0
+        self.relinearizations = 0
+        self._head = 0  # slot of the oldest sample
+        self._evicted = 0  # evictions since the sums were last rebuilt
+        self._buffers = None
+
+    def model_and_jacobian_at(self, x, *sensor_state):
+        """(predicted, H) of m samples reshaped to (m, k) and (m, k, n)"""
+        if self.model_and_jacobian is not None:
+            predicted, H = self.model_and_jacobian(x, *sensor_state)
+        else:
+            predicted = self.model(x, *sensor_state)
+            H = self.linearized_model(x, *sensor_state)
+        m = np.shape(sensor_state[0])[0]
+        predicted = np.reshape(predicted, (m, -1))
+        return predicted, np.reshape(H, predicted.shape + (x.shape[0],))
+
+    def _allocate(self, measurements, sensor_state):
+        W = self.window_size
+        k = measurements.shape[1]
+        n = self.x_estimate.shape[0]
+        self._buffers = {
+            "measurements": np.zeros((W, k)),
+            "sigma": np.ones((W, k)),
+            "H_white": np.zeros((W, k, n)),
+            "residuals_white": np.zeros((W, k)),
+            "sensor_state": [
+                np.zeros((W,) + np.shape(state)[1:], np.result_type(state, float))
+                for state in sensor_state
+            ],
+        }
+
+    def _slots(self, first, m):
+        """Ring buffer slots of the m samples starting first positions after the oldest"""
+        return (self._head + first + np.arange(m)) % self.window_size
+
+    def _accumulate(self, slots, sign):
+        H_white = self._buffers["H_white"][slots].reshape(-1, self.x_lin.shape[0])
+        residuals_white = self._buffers["residuals_white"][slots].reshape(-1, 1)
+        self.information += sign * (H_white.T @ H_white)
+        self.gradient += sign * (H_white.T @ residuals_white)
+
+    def _linearize(self, slots):
+        """Whitened H rows and residuals of the samples in slots at x_lin"""
+        buffers = self._buffers
+        sensor_state = [state[slots] for state in buffers["sensor_state"]]
+        predicted, H = self.model_and_jacobian_at(self.x_lin, *sensor_state)
+        sigma = buffers["sigma"][slots]
+        buffers["H_white"][slots] = H / sigma[..., np.newaxis]
+        buffers["residuals_white"][slots] = (
+            buffers["measurements"][slots] - predicted
+        ) / sigma
 
-                return x_estimate, P
+    def _rebuild(self):
+        self.information[...] = 0
+        self.gradient[...] = 0
+        self._accumulate(self._slots(0, self.count), 1)
+        self._evicted = 0
 
-            if iter == self.max_iterations - 1:
-                return print(f"Failed to converage after {iter + 1} iterations.")
-            x_current = x_estimate
+    def relinearize(self, x):
+        """Move x_lin to x and rebuild the window's rows and sums there"""
+        self.x_lin = np.array(x, dtype=float)
+        slots = self._slots(0, self.count)
+        self._linearize(slots)
+        self._rebuild()
+        self.relinearizations += 1
 
-        return x_current
+    def cost(self):
+        """Whitened sum of squared residuals of the window at x_lin"""
+        residuals_white = self._buffers["residuals_white"][self._slots(0, self.count)]
+        return float(np.sum(residuals_white**2))
+
+    def solve(self):
+        """Estimate and covariance from the accumulated sums, without relinearizing"""
+        correction_term, P = noise_models.solve_information(
+            self.information.copy(), self.gradient
+        )
+        return self.x_lin + correction_term, P
+
+    def update(self, measurements, *sensor_state, measurement_noise=None):
+        """Slide the window over m new samples and re-solve, returns (x_estimate, P)
+
+        measurements are (m,) or (m, k) and every sensor state array has m rows, samples
+        older than the newest window_size drop out. measurement_noise defaults to the
+        estimator's sigma. Until min_samples samples have arrived the initial estimate and
+        an infinite P are returned.
+        """
+        if measurement_noise is None:
+            measurement_noise = self.measurement_noise
+        m = np.shape(sensor_state[0])[0]
+        measurements = np.asarray(measurements, dtype=float).reshape(m, -1)
+        sigma = np.asarray(measurement_noise, dtype=float).reshape(-1)
+        if sigma.size == measurements.size:
+            sigma = sigma.reshape(measurements.shape)
+        elif sigma.size == m:
+            sigma = sigma[:, np.newaxis]
+        sigma = np.broadcast_to(sigma, measurements.shape)
+        if self._buffers is None:
+            self._allocate(measurements, sensor_state)
+        W = self.window_size
+        if m > W:  # only the newest window_size samples can stay
+            measurements, sigma = measurements[-W:], sigma[-W:]
+            sensor_state = [state[-W:] for state in sensor_state]
+            m = W
+        expired = max(0, self.count + m - W)
+        if expired:
+            self._accumulate(self._slots(0, expired), -1)
+            self._head = (self._head + expired) % W
+            self.count -= expired
+            self._evicted += expired
+        slots = self._slots(self.count, m)
+        buffers = self._buffers
+        buffers["measurements"][slots] = measurements
+        buffers["sigma"][slots] = sigma
+        for buffer, state in zip(buffers["sensor_state"], sensor_state):
+            buffer[slots] = state
+        self.count += m
+        self._linearize(slots)
+        if self._evicted >= W:
+            self._rebuild()
+        else:
+            self._accumulate(slots, 1)
+        if self.count < self.min_samples:
+            return self.x_estimate, self.P
+
+        x_estimate, P = self.solve()
+        for _ in range(self.max_iterations):
+            if np.linalg.norm(x_estimate - self.x_lin) <= self.tol:
+                break
+            x_previous, cost = self.x_lin, self.cost()
+            self.relinearize(x_estimate)
+            if self.cost() > cost:
+                # e.g. a short arc that does not yet observe the emitter, hold the estimate
+                self.relinearize(x_previous)
+                x_estimate, P = x_previous, self.solve()[1]
+                break
+            x_estimate, P = self.solve()
+        self.x_estimate, self.P = x_estimate, P
+        return x_estimate, P
 
 
 def model_equation_range_rate(grid_point, aircraft_positions, aircraft_velocity):
-    grid_emitter = np.array([grid_point[0], grid_point[1], 0.0])
-    range_rate = np.zeros((aircraft_positions.shape[0], 1))
-    for i, aircraft_position in enumerate(aircraft_positions):
-        range_rate[i] = np.dot(
-            aircraft_velocity[i], aircraft_position - grid_emitter
-        ) / np.linalg.norm(aircraft_position - grid_emitter)
-    return range_rate
+    """Range rate of a ground (altitude 0) grid point, or a (B, 2) batch of grid points
+
+    Returns (N, 1) for a single grid point or (B, N, 1) for a batch.
+    """
+    grid_point = np.asarray(grid_point, dtype=float)
+    grid_emitter = np.zeros(grid_point.shape[:-1] + (3,))
+    grid_emitter[..., :2] = grid_point[..., :2]
+    range_rate = model_equations.model_equation_rr(
+        grid_emitter, aircraft_positions, aircraft_velocity
+    )
+    return range_rate[..., np.newaxis]
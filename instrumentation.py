@@ -0,0 +1,106 @@
+import time
+from collections import defaultdict
+
+
+class SolverInstrumentation:
+    """Collects per iteration phase timings and convergence metrics from the solvers
+
+    Pass an instance as instrumentation= to IteratedLeastSquares, ExtendedKalmanFilter or
+    ExtendedKalmanFilterBank. Every iteration (or filter update) becomes one record holding
+    the wall time of each phase (model, jacobian, solve, covariance, ...) and the metrics the
+    solver reports (residual_norm, step_norm, condition_number, ...). Records are kept in
+    .records and passed to every callback as they are completed, and counters() aggregates
+    them for export to an external metrics system.
+
+    Example Input and output
+    probe = SolverInstrumentation(callbacks=[lambda record: log.debug(record)])
+    obj = IteratedLeastSquares(..., instrumentation=probe)
+    obj.solve_ils(sat_position, sat_velocity)
+    probe.counters()
+    {'ils.iterations': 4, 'ils.model.seconds': 0.0012, 'ils.model.calls': 5, ...}
+    """
+
+    enabled = True
+
+    def __init__(self, callbacks=(), keep_records=True):
+        self.callbacks = list(callbacks)
+        self.keep_records = keep_records
+        self.records = []
+        self._totals = defaultdict(float)
+        self._current = defaultdict(float)
+
+    clock = staticmethod(time.perf_counter)
+
+    def phase(self, name, start):
+        """Charge the time since start (a value of clock()) to phase name, returns clock()"""
+        now = time.perf_counter()
+        self._current[f"{name}_s"] += now - start
+        self._current[f"{name}_calls"] += 1
+        return now
+
+    def _accumulate(self, solver, record):
+        totals = self._totals
+        for key, value in record.items():
+            if key.endswith("_s"):
+                totals[f"{solver}.{key[:-2]}.seconds"] += value
+            elif key.endswith("_calls"):
+                totals[f"{solver}.{key[:-6]}.calls"] += value
+
+    def end_iteration(self, solver, **metrics):
+        """Close the current record for solver with its metrics and hand it to the callbacks"""
+        record = {"solver": solver, **self._current, **metrics}
+        self._current = defaultdict(float)
+        self._totals[f"{solver}.iterations"] += 1
+        self._accumulate(solver, record)
+        if self.keep_records:
+            self.records.append(record)
+        for callback in self.callbacks:
+            callback(record)
+
+    def end_solve(self, solver, **metrics):
+        """Count a completed solve and add its metrics (e.g. converged) to the counters
+
+        Phases timed after the last iteration, such as the covariance, are charged here.
+        """
+        self._accumulate(solver, self._current)
+        self._current = defaultdict(float)
+        self._totals[f"{solver}.solves"] += 1
+        for key, value in metrics.items():
+            self._totals[f"{solver}.{key}"] += float(value)
+
+    def counters(self):
+        """Aggregated totals as a flat {name: number} dict"""
+        return {
+            key: int(value) if float(value).is_integer() else value
+            for key, value in self._totals.items()
+        }
+
+    def reset(self):
+        self.records = []
+        self._totals = defaultdict(float)
+        self._current = defaultdict(float)
+
+
+class NullInstrumentation:
+    """Disabled instrumentation, every hook is a no-op and solvers skip optional metrics"""
+
+    enabled = False
+
+    @staticmethod
+    def clock():
+        return 0.0
+
+    def phase(self, name, start):
+        return 0.0
+
+    def end_iteration(self, solver, **metrics):
+        pass
+
+    def end_solve(self, solver, **metrics):
+        pass
+
+    def counters(self):
+        return {}
+
+
+DISABLED = NullInstrumentation()
@@ -4,71 +4,132 @@ import model_equations
 SPEED_OF_LIGHT = 299_792_458.0
 
 
+def _range_rate_partials(line_of_sight, norm, r_R, sat_velocity):
+    """d(range rate)/d(emitter position) from precomputed range geometry
+
+    d/dx [v . (s - x) / |s - x|] = -v / |s - x| + (s - x) * (v . (s - x)) / |s - x|^3
+    """
+    norm = norm[..., np.newaxis]
+    return -sat_velocity / norm + line_of_sight * (r_R[..., np.newaxis] / norm**3)
+
+
 def range_rate_jacobian(emitter_estimate_position, sat_position, sat_velocity):
     # since our emitter is stationary we can omit the partial wrt to velocity vector columns so H is Nx3 not Nx6
-    norm = np.linalg.norm(sat_position - emitter_estimate_position.T, axis=1)
-    r_R = (
-        (sat_velocity[:, 0] * (sat_position[:, 0] - emitter_estimate_position[0]))
-        + (sat_velocity[:, 1] * (sat_position[:, 1] - emitter_estimate_position[1]))
-        + (sat_velocity[:, 2] * (sat_position[:, 2] - emitter_estimate_position[2]))
+    line_of_sight, norm, r_R = model_equations.range_geometry(
+        emitter_estimate_position, sat_position, sat_velocity
     )
-    partial_x = -sat_velocity[:, 0] / norm
-    -((sat_position[:, 0] - emitter_estimate_position[0]) / (norm**3)) * r_R
-    partial_y = -sat_velocity[:, 1] / norm
-    -((sat_position[:, 1] - emitter_estimate_position[1]) / (norm**3)) * r_R
-    partial_z = -sat_velocity[:, 2] / norm
-    -((sat_position[:, 2] - emitter_estimate_position[2]) / (norm**3)) * r_R
-    H = np.column_stack([partial_x, partial_y, partial_z])
+    H = _range_rate_partials(line_of_sight, norm, r_R, sat_velocity)
     return H
 
 
 def jacobian_foa(parameter_estimate, aircraft_position, aircraft_velocity):
-    """"""
-    parameter_estimate = parameter_estimate.flatten()
-    norm = np.linalg.norm(aircraft_position - parameter_estimate[:3], axis=1)
-    r_R = (
-        (aircraft_velocity[:, 0] * (aircraft_position[:, 0] - parameter_estimate[0]))
-        + (aircraft_velocity[:, 1] * (aircraft_position[:, 1] - parameter_estimate[1]))
-        + (aircraft_velocity[:, 2] * (aircraft_position[:, 2] - parameter_estimate[2]))
-    )
+    """FOA jacobian with columns d/dx, d/dy, d/dz, d/df"""
+    return model_and_jacobian_foa(parameter_estimate, aircraft_position, aircraft_velocity)[1]
 
-    partial_x = (
-        parameter_estimate[3]
-        * (-1 / SPEED_OF_LIGHT)
-        * (
-            -aircraft_velocity[:, 0] / norm
-            + ((aircraft_position[:, 0] - parameter_estimate[0]) / (norm**3)) * r_R
-        )
-    )
-    partial_y = (
-        parameter_estimate[3]
-        * (-1 / SPEED_OF_LIGHT)
-        * (
-            -aircraft_velocity[:, 1] / norm
-            + ((aircraft_position[:, 1] - parameter_estimate[1]) / (norm**3)) * r_R
-        )
+
+def jacobian_range_difference(x_old, sensor_positions, reference=0):
+    """TDOA jacobian, each row is the difference of unit vectors u_i - u_j (u = (x - s)/|x - s|)"""
+    return model_and_jacobian_range_difference(x_old, sensor_positions, reference)[1]
+
+
+def jacobian_doa(estimate_location, sensor_location):
+    return model_and_jacobian_doa(estimate_location, sensor_location)[1]
+
+
+def model_and_jacobian_rr(
+    emitter_estimate_position, sat_position, sat_velocity, measurements=None
+):
+    """Fused range rate model and jacobian sharing one evaluation of the range geometry
+
+    Returns (predicted, H), or (residuals, H) when measurements are provided.
+    """
+    line_of_sight, norm, r_R = model_equations.range_geometry(
+        emitter_estimate_position, sat_position, sat_velocity
     )
-    partial_z = (
-        parameter_estimate[3]
-        * (-1 / SPEED_OF_LIGHT)
-        * (
-            -aircraft_velocity[:, 2] / norm
-            + ((aircraft_position[:, 2] - parameter_estimate[2]) / (norm**3)) * r_R
-        )
+    predicted = r_R / norm
+    H = _range_rate_partials(line_of_sight, norm, r_R, sat_velocity)
+    if measurements is not None:
+        return measurements - predicted, H
+    return predicted, H
+
+
+def model_and_jacobian_foa(
+    parameter_estimate, aircraft_position, aircraft_velocity, measurements=None
+):
+    """Fused FOA model and jacobian for parameters [x, y, z, f]
+
+    Returns (predicted, H), or (residuals, H) when measurements are provided.
+    """
+    parameter_estimate = model_equations.as_parameter_rows(parameter_estimate)
+    frequency = parameter_estimate[..., 3, np.newaxis]
+    line_of_sight, norm, r_R = model_equations.range_geometry(
+        parameter_estimate, aircraft_position, aircraft_velocity
     )
-    partial_foa = 1 - (
-        model_equations.model_equation_rr(
-            parameter_estimate[:3], aircraft_position, aircraft_velocity
-        )
-        / SPEED_OF_LIGHT
+    partial_foa = 1 - (r_R / norm) / SPEED_OF_LIGHT
+    predicted = frequency * partial_foa
+    partial_position = (frequency * (-1 / SPEED_OF_LIGHT))[..., np.newaxis] * (
+        _range_rate_partials(line_of_sight, norm, r_R, aircraft_velocity)
     )
-    H = np.column_stack([partial_x, partial_y, partial_z, partial_foa])
-    return H
+    H = np.concatenate([partial_position, partial_foa[..., np.newaxis]], axis=-1)
+    if measurements is not None:
+        return measurements - predicted, H
+    return predicted, H
 
 
-def jacobian_doa(estimate_location, sensor_location):
-    rng = (estimate_location[0] - sensor_location[:,0])**2 + (estimate_location[1] - sensor_location[:,1])**2
-    partial_x = -(1/rng)*(estimate_location[1] - sensor_location[:,1])
-    partial_y = (1/rng)*(estimate_location[0] - sensor_location[:,0])
-    partial_b = np.repeat(1, len(sensor_location))
-    return np.column_stack([partial_x, partial_y, partial_b])
\ No newline at end of file
+def model_and_jacobian_range_difference(
+    x_old, sensor_positions, reference=0, measurements=None
+):
+    """Fused N sensor TDOA model and jacobian, by default against reference sensor 0
+
+    reference selects the sensor pairs as in model_equations.range_difference_pairs.
+    Returns (predicted, H), or (residuals, H) when measurements are provided.
+    """
+    emitter = model_equations.as_parameter_rows(x_old)[..., np.newaxis, :3]
+    difference = emitter - sensor_positions
+    ranges = np.linalg.norm(difference, axis=-1)
+    unit_vectors = difference / ranges[..., np.newaxis]
+    if isinstance(reference, int) and reference == 0:
+        predicted = ranges[..., 1:] - ranges[..., :1]
+        H = unit_vectors[..., 1:, :] - unit_vectors[..., :1, :]
+    else:
+        pairs = model_equations.range_difference_pairs(ranges.shape[-1], reference)
+        predicted = ranges[..., pairs[:, 0]] - ranges[..., pairs[:, 1]]
+        H = unit_vectors[..., pairs[:, 0], :] - unit_vectors[..., pairs[:, 1], :]
+    if measurements is not None:
+        return measurements - predicted, H
+    return predicted, H
+
+
+def model_and_jacobian_doa(
+    estimate_location, sensor_location, bias=0, measurements=None
+):
+    """Fused 2D DOA model and jacobian with columns d/dx, d/dy, d/dbias
+
+    Returns (predicted, H), or (residuals, H) when measurements are provided.
+    """
+    estimate_location = model_equations.as_parameter_rows(estimate_location)
+    dx = estimate_location[..., 0, np.newaxis] - sensor_location[..., 0]
+    dy = estimate_location[..., 1, np.newaxis] - sensor_location[..., 1]
+    rng = dx**2 + dy**2
+    predicted = np.arctan2(dy, dx) + bias
+    partial_x = -(1 / rng) * dy
+    partial_y = (1 / rng) * dx
+    partial_b = np.ones_like(rng)
+    H = np.stack([partial_x, partial_y, partial_b], axis=-1)
+    if measurements is not None:
+        return measurements - predicted, H
+    return predicted, H
+
+
+def model_and_jacobian_doa_bias(parameter_estimate, sensor_location, measurements=None):
+    """Fused 2D DOA model and jacobian with the bias carried as a parameter [x, y, bias]
+
+    Returns (predicted, H), or (residuals, H) when measurements are provided.
+    """
+    parameter_estimate = model_equations.as_parameter_rows(parameter_estimate)
+    return model_and_jacobian_doa(
+        parameter_estimate[..., :2],
+        sensor_location,
+        parameter_estimate[..., 2, np.newaxis],
+        measurements,
+    )
@@ -32,3 +32,41 @@ def tdoa(tau, p1, p2, partb):
     hyperbola_vector_negative = r @ h_vector_negative + m.reshape(2, 1)
 
     return hyperbola_vector_positive, hyperbola_vector_negative
+
+
+def tdoa_hyperbolas(range_differences, sensor_positions, pairs, extent, n_points=200):
+    """TDOA isochrones in 2D for every sensor pair in one call
+
+    Pair (i, j) with range difference d = r_i - r_j is the branch of the hyperbola with foci
+    s_i, s_j on the side of s_j (d > 0) or s_i (d < 0). Each branch is sampled only along
+    itself with the parametric form (a cosh t, b sinh t), uniform in t so points are densest
+    near the vertex where the curvature is highest, out to roughly extent from the pair
+    midpoint. Units of range_differences, sensor_positions and extent must match.
+
+    Args:
+        range_differences (np.ndarray): (P,) range differences r_i - r_j (c * tau)
+        sensor_positions (np.ndarray): (N, 2) sensor positions
+        pairs (np.ndarray): (P, 2) sensor index pairs (i, j), see model_equations.range_difference_pairs
+        extent (float): distance from each pair's midpoint the branches are drawn out to
+        n_points (int): samples per branch
+
+    Returns: (P, n_points, 2) branch points, NaN for pairs whose |d| exceeds the baseline
+    """
+    range_differences = np.asarray(range_differences, dtype=float).reshape(-1)
+    sensor_positions = np.asarray(sensor_positions, dtype=float)[:, :2]
+    pairs = np.asarray(pairs).reshape(-1, 2)
+    p1 = sensor_positions[pairs[:, 0]]
+    p2 = sensor_positions[pairs[:, 1]]
+    baseline = p2 - p1
+    c_prime = 0.5 * np.linalg.norm(baseline, axis=1)
+    axis = baseline / (2 * c_prime[:, np.newaxis])
+    normal = np.column_stack([-axis[:, 1], axis[:, 0]])
+    m = 0.5 * (p1 + p2)
+    a = 0.5 * range_differences
+    with np.errstate(invalid="ignore"):
+        b = np.sqrt(c_prime**2 - a**2)
+    t_max = np.arcsinh(extent / b)
+    t = np.linspace(-1, 1, n_points) * t_max[:, np.newaxis]
+    x = (a[:, np.newaxis] * np.cosh(t))[..., np.newaxis]
+    y = (b[:, np.newaxis] * np.sinh(t))[..., np.newaxis]
+    return m[:, np.newaxis] + x * axis[:, np.newaxis] + y * normal[:, np.newaxis]
@@ -0,0 +1,237 @@
+import json
+import os
+import numpy as np
+
+# column name: (dtype, per row shape)
+COLUMNS = {
+    "time": ("<f8", ()),
+    "sensor_position": ("<f8", (3,)),
+    "sensor_velocity": ("<f8", (3,)),
+    "measurement": ("<f8", ()),
+    "noise": ("<f8", ()),
+}
+MANIFEST = "manifest.json"
+TIME_INDEX = "time_index.bin"
+FORMAT_VERSION = 1
+
+
+class MeasurementStoreWriter:
+    """Append a collection pass to an on-disk columnar measurement store
+
+    A store is a directory holding one raw little endian file per column (time, sensor
+    ECEF position and velocity, measurement and its standard deviation), a sparse time
+    index holding the time of every index_stride-th row and a manifest.json with the row
+    count, dtypes and shapes. Rows must be appended in non decreasing time order, chunks
+    are written straight through so a pass larger than RAM can be converted piece by piece.
+    The manifest is written by close(), a store is only readable once it is complete. Leaving
+    the with block on an exception, or calling abort(), closes the files without it.
+
+    Example Input and output
+    with MeasurementStoreWriter("pass_0412") as writer:
+        for t, position, velocity, doppler in source:
+            writer.append(t, position, velocity, doppler, noise=sigma)
+    """
+
+    def __init__(self, path, index_stride: int = 4096, dtype=np.float64):
+        """
+        Args:
+            path (str): store directory, created if missing, must not already hold a store
+            index_stride (int): rows between entries of the sparse time index
+            dtype: dtype of every column except time, which is always float64
+        """
+        if index_stride < 1:
+            raise ValueError("index_stride must be positive")
+        if os.path.exists(os.path.join(path, MANIFEST)):
+            raise FileExistsError(f"{path} already holds a measurement store")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.index_stride = int(index_stride)
+        self.dtypes = {
+            name: np.dtype(column_dtype if name == "time" else dtype).newbyteorder("<")
+            for name, (column_dtype, _) in COLUMNS.items()
+        }
+        self.rows = 0
+        self._last_time = -np.inf
+        self._index = []
+        self._files = {
+            name: open(os.path.join(path, f"{name}.bin"), "wb") for name in COLUMNS
+        }
+
+    def append(self, time, sensor_position, sensor_velocity, measurement, noise):
+        """Append m rows, noise may be one sigma shared by the chunk or m sigmas"""
+        time = np.asarray(time, dtype=float).reshape(-1)
+        m = time.size
+        if m == 0:
+            return
+        if time[0] < self._last_time or np.any(np.diff(time) < 0):
+            raise ValueError("rows must be appended in non decreasing time order")
+        columns = {
+            "time": time,
+            "sensor_position": np.reshape(sensor_position, (m, 3)),
+            "sensor_velocity": np.reshape(sensor_velocity, (m, 3)),
+            "measurement": np.reshape(measurement, (m,)),
+            "noise": np.broadcast_to(np.reshape(noise, -1), (m,)),
+        }
+        for name, values in columns.items():
+            values = np.ascontiguousarray(values, dtype=self.dtypes[name])
+            self._files[name].write(values.data)
+        # rows whose global index is a multiple of index_stride enter the time index
+        self._index.append(time[-self.rows % self.index_stride :: self.index_stride])
+        self.rows += m
+        self._last_time = time[-1]
+
+    def abort(self):
+        """Close the column files without a manifest, the partial store stays unreadable"""
+        if self._files is None:
+            return
+        for file in self._files.values():
+            file.close()
+        self._files = None
+
+    def close(self):
+        if self._files is None:
+            return
+        self.abort()
+        index = np.concatenate([np.zeros(0)] + self._index).astype("<f8")
+        index.tofile(os.path.join(self.path, TIME_INDEX))
+        manifest = {
+            "version": FORMAT_VERSION,
+            "rows": self.rows,
+            "index_stride": self.index_stride,
+            "columns": {
+                name: {"dtype": self.dtypes[name].str, "shape": list(shape)}
+                for name, (_, shape) in COLUMNS.items()
+            },
+        }
+        with open(os.path.join(self.path, MANIFEST), "w") as file:
+            json.dump(manifest, file, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class MeasurementWindow:
+    """Rows [start, stop) of a MeasurementStore as zero copy views of the mapped columns
+
+    Attributes time (m,), sensor_position (m, 3), sensor_velocity (m, 3), measurement (m,)
+    and noise (m,) can be passed directly to the models, jacobians, IteratedLeastSquares
+    and the EKF, only the pages they touch are read from disk.
+    """
+
+    def __init__(self, columns, start, stop):
+        self.start = start
+        self.stop = stop
+        for name, column in columns.items():
+            setattr(self, name, column[start:stop])
+
+    def __len__(self):
+        return self.stop - self.start
+
+    @property
+    def sensor_state(self):
+        """(sensor_position, sensor_velocity), the trailing arguments of the rr and FOA models"""
+        return self.sensor_position, self.sensor_velocity
+
+    def ekf_feed(self, batch: int = 1):
+        """ExtendedKalmanFilter.stream items (measurement, noise, position, velocity) of batch rows"""
+        for first in range(0, len(self), batch):
+            rows = slice(first, first + batch)
+            yield (
+                self.measurement[rows],
+                self.noise[rows],
+                self.sensor_position[rows],
+                self.sensor_velocity[rows],
+            )
+
+
+class MeasurementStore:
+    """Read only memory mapped view of a store written by MeasurementStoreWriter
+
+    Columns are mapped, not loaded, so opening a pass of any size costs only the sparse
+    time index. Windows are found with a binary search of the index followed by one of a
+    single index block of the time column, and chunks() walks a pass in bounded windows
+    so the resident memory stays at the size of the chunk being processed.
+
+    Example Input and output
+    store = MeasurementStore("pass_0412")
+    window = store.window(start_time=120.0, stop_time=180.0)
+    model_equations.model_equation_rr(x, *window.sensor_state)  [(m,)]
+    for window in store.chunks(rows=100_000):
+        for x_estimate, P in ekf.stream(window.ekf_feed(batch=32)):
+            ...
+    """
+
+    def __init__(self, path):
+        manifest_path = os.path.join(path, MANIFEST)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"{path} is not a complete measurement store")
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+        if manifest.get("version") != FORMAT_VERSION:
+            raise ValueError(f"unsupported store version {manifest.get('version')}")
+        self.path = path
+        self.rows = manifest["rows"]
+        self.index_stride = manifest["index_stride"]
+        self.columns = {}
+        for name, spec in manifest["columns"].items():
+            shape = (self.rows,) + tuple(spec["shape"])
+            if self.rows:
+                column = np.memmap(
+                    os.path.join(path, f"{name}.bin"), spec["dtype"], "r", shape=shape
+                )
+            else:
+                column = np.zeros(shape, spec["dtype"])  # mmap can not map empty files
+            self.columns[name] = column
+        self.time_index = np.fromfile(os.path.join(path, TIME_INDEX), "<f8")
+
+    def __len__(self):
+        return self.rows
+
+    def __getattr__(self, name):
+        columns = self.__dict__.get("columns", {})
+        if name in columns:
+            return columns[name]
+        raise AttributeError(name)
+
+    def search(self, time: float):
+        """Index of the first row with a time >= time"""
+        block = int(np.searchsorted(self.time_index, time, side="left"))
+        low = max(block - 1, 0) * self.index_stride
+        high = min(block * self.index_stride, self.rows)
+        return low + int(np.searchsorted(self.columns["time"][low:high], time))
+
+    def window(self, start_time: float = None, stop_time: float = None):
+        """Rows with start_time <= time < stop_time, either bound may be None"""
+        start = 0 if start_time is None else self.search(start_time)
+        stop = self.rows if stop_time is None else self.search(stop_time)
+        return MeasurementWindow(self.columns, start, max(start, stop))
+
+    def __getitem__(self, rows: slice):
+        start, stop, step = rows.indices(self.rows)
+        if step != 1:
+            raise ValueError("measurement windows must be contiguous")
+        return MeasurementWindow(self.columns, start, max(start, stop))
+
+    def chunks(self, rows: int = None, duration: float = None):
+        """Consecutive windows covering the pass of at most rows rows or duration seconds each"""
+        if (rows is None) == (duration is None):
+            raise ValueError("give exactly one of rows or duration")
+        if rows is not None:
+            if rows < 1:
+                raise ValueError("rows must be positive")
+            for start in range(0, self.rows, rows):
+                yield self[start : start + rows]
+            return
+        if duration <= 0:
+            raise ValueError("duration must be positive")
+        start = 0
+        while start < self.rows:
+            stop = max(self.search(self.columns["time"][start] + duration), start + 1)
+            yield MeasurementWindow(self.columns, start, stop)
+            start = stop
@@ -1,59 +1,162 @@
 import numpy as np
+from geometry_cache import DEFAULT_CACHE
 
 SPEED_OF_LIGHT = 299_792_458.0
 
 
-def model_equation_rr(emitter_estimate_position, sat_position, sat_velocity):
+def as_parameter_rows(parameter_estimate):
+    """Normalise a parameter estimate to (n,) for one candidate or (B, n) for a batch
+
+    Column vectors (n x 1) used by IteratedLeastSquares are flattened so every model
+    below broadcasts the same way regardless of how the estimate was stored. float32
+    estimates are kept float32 so the models evaluate in the precision they are given.
+    """
+    parameter_estimate = np.asarray(parameter_estimate)
+    if parameter_estimate.dtype != np.float32:
+        parameter_estimate = parameter_estimate.astype(float, copy=False)
+    if parameter_estimate.ndim == 2 and parameter_estimate.shape[1] == 1:
+        return parameter_estimate[:, 0]
+    return parameter_estimate
+
+
+def range_geometry(emitter_estimate_position, sat_position, sat_velocity):
+    """Shared range rate geometry for one or a batch of candidate emitter positions
+
+    Returns the line of sight vectors (sat_position - emitter), their norms and the
+    projection of sat_velocity on the line of sight (v . r). Shapes are (N, 3), (N,), (N,)
+    for a single candidate or (B, N, 3), (B, N), (B, N) for a (B, 3) batch.
+    """
+    emitter = as_parameter_rows(emitter_estimate_position)[..., np.newaxis, :3]
+    line_of_sight = sat_position - emitter
+    norm = np.sqrt(np.einsum("...i,...i->...", line_of_sight, line_of_sight))
+    r_R = np.einsum("...i,...i->...", sat_velocity, line_of_sight)
+    return line_of_sight, norm, r_R
+
+
+def range_rate_sensor_terms(sat_position, sat_velocity, track_id=None):
+    """(v.s, |s|^2) of a sensor track, the range rate terms that do not depend on the emitter
+
+    With a track_id the pair is kept in geometry_cache.DEFAULT_CACHE, so every emitter
+    hypothesis scored against the same ephemeris reuses it. The arrays are not checked on
+    lookup, a track_id must name arrays that never change (see GeometryCache).
+    """
+
+    def compute():
+        return (
+            np.einsum("...i,...i->...", sat_velocity, sat_position),
+            np.einsum("...i,...i->...", sat_position, sat_position),
+        )
+
+    if track_id is None:
+        return compute()
+    return DEFAULT_CACHE.get(("range_rate_sensor_terms", track_id), compute)
+
+
+def model_equation_rr(
+    emitter_estimate_position, sat_position, sat_velocity, track_id=None
+):
+    """Range rate of one (3,) or a batch of (B, 3) emitter positions
+
+    With a track_id naming the (sat_position, sat_velocity) track the cached sensor terms
+    are used, range rate = (v.s - v.x) / sqrt(|s|^2 - 2 s.x + |x|^2), which replaces the
+    (B, N, 3) line of sight temporaries with two matrix products. Pass it to
+    IteratedLeastSquares through functools.partial(model_equation_rr, track_id=...).
+    """
     # range rate = rho_dot * rho_hat = (sat_velocity - emitter veloicty) * (sat_position - emitter position)/norm(sat_position - emitter position)
     # Since emitter velocity is 0 we have
     # range rate =  sat_velocity * (sat_position - emitter position)/norm(sat_position - emitter position)
     # since emitter position is unknown, using the current estimated position gives our predicted range rates, thus...
     # predicted_range_rate = sat_velocity_i * (sat_position_i - emitter_estimate_position)/norm(sat_position_i - emitter_estimate_position)
     # REF: Orbit Determination at a Single Ground Station Using Range Rate Data, Daniel Coyle" and Henry J. Pernicka
-    predicted_range_rate = np.zeros((sat_position.shape[0], 1))
-    for i, sat_pos in enumerate(sat_position):
-        predicted_range_rate[i] = np.dot(
-            sat_velocity[i], sat_pos[:, np.newaxis] - emitter_estimate_position
-        ) / np.linalg.norm(sat_pos[:, np.newaxis] - emitter_estimate_position)
-    return predicted_range_rate.flatten()
-
-
-def model_equation_range_difference(x_old, sensor_positions):
-    """TDOA Model"""
-    psedorange_estimate = np.array(
-        [
-            np.linalg.norm(x_old - sensor_positions[1])
-            - np.linalg.norm(x_old - sensor_positions[0]),  # emitter 2,1
-            np.linalg.norm(x_old - sensor_positions[2])
-            - np.linalg.norm(x_old - sensor_positions[0]),  # emitter 3,1
-            np.linalg.norm(x_old - sensor_positions[3])
-            - np.linalg.norm(x_old - sensor_positions[0]),  # emitter 4,1
-        ]
-    )
+    if track_id is not None:
+        v_dot_s, s_squared = range_rate_sensor_terms(sat_position, sat_velocity, track_id)
+        emitter = as_parameter_rows(emitter_estimate_position)[..., :3, np.newaxis]
+        norm = np.matmul(sat_position, emitter)[..., 0]
+        norm *= -2
+        norm += s_squared
+        norm += np.einsum("...ij,...ij->...", emitter, emitter)[..., np.newaxis]
+        np.sqrt(norm, out=norm)
+        range_rate = np.matmul(sat_velocity, emitter)[..., 0]
+        np.subtract(v_dot_s, range_rate, out=range_rate)
+        range_rate /= norm
+        return range_rate
+    _, norm, r_R = range_geometry(emitter_estimate_position, sat_position, sat_velocity)
+    return r_R / norm
+
+
+def range_difference_pairs(n_sensors, reference=0):
+    """(P, 2) sensor index pairs (i, j), each giving the range difference r_i - r_j
+
+    reference is a sensor index, giving the N - 1 differences of every other sensor against
+    it in ascending order, or "pairwise" for all N (N - 1) / 2 pairs with i > j. An explicit
+    (P, 2) array of pairs is returned unchanged.
+    """
+    if isinstance(reference, str):
+        if reference != "pairwise":
+            raise ValueError(f"Unknown reference {reference!r}")
+        j, i = np.triu_indices(n_sensors, k=1)
+        return np.column_stack([i, j])
+    reference = np.asarray(reference)
+    if reference.ndim == 2:
+        return reference
+    others = np.delete(np.arange(n_sensors), int(reference))
+    return np.column_stack([others, np.full(others.size, int(reference))])
+
+
+def select_reference_sensor(sensor_positions, emitter_estimate=None):
+    """Index of the sensor to difference against
+
+    The sensor closest to the emitter estimate (shortest, highest SNR path), or closest to
+    the centroid of the sensors when no estimate is available.
+    """
+    sensor_positions = np.asarray(sensor_positions, dtype=float)
+    if emitter_estimate is None:
+        target = sensor_positions.mean(axis=0)
+    else:
+        target = as_parameter_rows(emitter_estimate)[: sensor_positions.shape[-1]]
+    return int(np.argmin(np.linalg.norm(sensor_positions - target, axis=-1)))
+
+
+def model_equation_range_difference(x_old, sensor_positions, reference=0):
+    """TDOA Model for N sensors
 
+    Range differences r_i - r_j for the pairs given by reference (see range_difference_pairs),
+    by default every sensor against sensor 0 (emitter 2,1, emitter 3,1, ...). Every range is
+    computed once in one broadcast and the pairs are gathered from it.
+    """
+    emitter = as_parameter_rows(x_old)[..., np.newaxis, :3]
+    ranges = np.linalg.norm(emitter - sensor_positions, axis=-1)
+    if isinstance(reference, int) and reference == 0:
+        return ranges[..., 1:] - ranges[..., :1]
+    pairs = range_difference_pairs(ranges.shape[-1], reference)
+    psedorange_estimate = ranges[..., pairs[:, 0]] - ranges[..., pairs[:, 1]]
     return psedorange_estimate
 
 
 def model_equation_doa(estimate_location, sensor_location, bias=0):
     """2 d for now"""
+    estimate_location = as_parameter_rows(estimate_location)
     return (
         np.arctan2(
-            estimate_location[1] - sensor_location[:, 1],
-            estimate_location[0] - sensor_location[:, 0]
+            estimate_location[..., 1, np.newaxis] - sensor_location[..., 1],
+            estimate_location[..., 0, np.newaxis] - sensor_location[..., 0],
         )
         + bias
     )
 
 
-def model_equation_foa(parameter_estimate, aircraft_position, aircraft_velocity):
-    frequency = parameter_estimate[3]
+def model_equation_foa(
+    parameter_estimate, aircraft_position, aircraft_velocity, track_id=None
+):
+    parameter_estimate = as_parameter_rows(parameter_estimate)
+    frequency = parameter_estimate[..., 3, np.newaxis]
     predicted_frequency = frequency * (
         1
         - (
             model_equation_rr(
-                parameter_estimate.flatten()[:3], aircraft_position, aircraft_velocity
+                parameter_estimate, aircraft_position, aircraft_velocity, track_id
             )
             / SPEED_OF_LIGHT
         )
     )
-    return predicted_frequency.flatten()
+    return predicted_frequency
@@ -0,0 +1,153 @@
+import numpy as np
+import scipy
+
+
+class ScalarNoise:
+    """IID measurement noise with one standard deviation shared by every measurement
+
+    R = sigma**2 * I, whitening is a single division.
+    """
+
+    def __init__(self, sigma: float):
+        self.sigma = float(np.asarray(sigma, dtype=float).reshape(-1)[0])
+
+    def covariance(self, n: int):
+        """Dense n x n measurement error covariance matrix R"""
+        return np.eye(n) * self.sigma**2
+
+    def whiten(self, values: np.ndarray):
+        """Apply R^-1/2 along the first (measurement) axis of residuals or a jacobian"""
+        return values / self.sigma
+
+
+class DiagonalNoise:
+    """Uncorrelated measurement noise with a standard deviation per measurement
+
+    R = diag(sigma**2), whitening scales each row by 1 / sigma_i.
+    """
+
+    def __init__(self, sigma: np.ndarray):
+        self.sigma = np.asarray(sigma, dtype=float).reshape(-1)
+
+    def covariance(self, n: int):
+        """Dense n x n measurement error covariance matrix R"""
+        return np.diag(np.broadcast_to(self.sigma**2, (n,)))
+
+    def whiten(self, values: np.ndarray):
+        """Apply R^-1/2 along the first (measurement) axis of residuals or a jacobian
+
+        float32 values stay float32 so mixed precision jacobians keep their footprint.
+        """
+        values = np.asarray(values)
+        sigma = self.sigma
+        if values.dtype == np.float32:
+            sigma = sigma.astype(np.float32)
+        return values / sigma.reshape((-1,) + (1,) * (values.ndim - 1))
+
+
+class DenseNoise:
+    """Correlated measurement noise given as a full covariance matrix
+
+    R = L L^T is Cholesky factored once, whitening is a triangular solve with L.
+    """
+
+    def __init__(self, covariance: np.ndarray):
+        self.R = np.asarray(covariance, dtype=float)
+        self.L = np.linalg.cholesky(self.R)
+
+    def covariance(self, n: int):
+        """Dense n x n measurement error covariance matrix R"""
+        return self.R
+
+    def whiten(self, values: np.ndarray):
+        """Apply R^-1/2 along the first (measurement) axis of residuals or a jacobian"""
+        return scipy.linalg.solve_triangular(self.L, values, lower=True)
+
+
+def as_noise_model(measurement_noise, n: int):
+    """Choose the cheapest noise model that represents measurement_noise for n measurements
+
+    Accepts an existing noise model, a scalar or single element sigma, a length n vector of
+    sigmas, or an n x n covariance matrix.
+    """
+    if isinstance(measurement_noise, (ScalarNoise, DiagonalNoise, DenseNoise)):
+        return measurement_noise
+    noise = np.asarray(measurement_noise, dtype=float)
+    if noise.size == 1:
+        return ScalarNoise(noise)
+    if noise.ndim == 2 and noise.shape == (n, n):
+        return DenseNoise(noise)
+    if noise.size == n:
+        return DiagonalNoise(noise)
+    raise ValueError(
+        f"measurement noise of shape {noise.shape} does not match {n} measurements"
+    )
+
+
+def solve_normal_equations(
+    H_white: np.ndarray, residuals_white: np.ndarray, damping: float = 0.0
+):
+    """Solve (H^T R^-1 H) dx = H^T R^-1 r from whitened H and r
+
+    Uses a Cholesky factorization of the n x n information matrix and falls back to the
+    pseudo inverse when the geometry leaves it singular. A positive damping solves the
+    Levenberg-Marquardt system (I + damping * diag(I)) dx = H^T R^-1 r instead, P is then
+    the inverse of the damped matrix. Returns (dx, P).
+    """
+    information, gradient = normal_equations(H_white, residuals_white)
+    return solve_information(information, gradient, damping)
+
+
+def normal_equations(
+    H_white: np.ndarray, residuals_white: np.ndarray = None, block_rows: int = 8192
+):
+    """H^T R^-1 H and H^T R^-1 r from whitened H and r, always accumulated in float64
+
+    float64 inputs take one matrix product each. Lower precision inputs (float32 jacobians
+    of precision.MixedPrecisionModel) are cast block_rows rows at a time, so the N x n
+    matrix is read from memory at its own width while every sum is carried in float64.
+    Returns (information, gradient), gradient is None without residuals.
+    """
+    if H_white.dtype == np.float64 and (
+        residuals_white is None or residuals_white.dtype == np.float64
+    ):
+        gradient = None if residuals_white is None else H_white.T @ residuals_white
+        return H_white.T @ H_white, gradient
+    m, n = H_white.shape
+    information = np.zeros((n, n))
+    gradient = None
+    if residuals_white is not None:
+        gradient = np.zeros((n,) + residuals_white.shape[1:])
+    for start in range(0, m, block_rows):
+        block = H_white[start : start + block_rows].astype(np.float64)
+        information += block.T @ block
+        if gradient is not None:
+            gradient += block.T @ residuals_white[start : start + block_rows]
+    return information, gradient
+
+
+def solve_information(information: np.ndarray, gradient: np.ndarray, damping: float = 0.0):
+    """Solve information dx = gradient for an accumulated H^T R^-1 H and H^T R^-1 r
+
+    The damping and fallback are those of solve_normal_equations, information is modified
+    in place when damping is positive. Returns (dx, P). Raises ValueError when either
+    input holds NaN or inf, e.g. from a diverging iteration, instead of passing them on to
+    the estimate and covariance.
+    """
+    if not (np.isfinite(information).all() and np.isfinite(gradient).all()):
+        raise ValueError(
+            "normal equations are not finite, the model or jacobian returned NaN or inf"
+        )
+    if damping:
+        information[np.diag_indices_from(information)] *= 1 + damping
+    try:
+        # finiteness was checked above, skip scipy's repeated scans
+        factor = scipy.linalg.cho_factor(information, check_finite=False)
+        P = scipy.linalg.cho_solve(
+            factor, np.eye(information.shape[0]), check_finite=False
+        )
+        correction_term = scipy.linalg.cho_solve(factor, gradient, check_finite=False)
+    except np.linalg.LinAlgError:
+        P = np.linalg.pinv(information, hermitian=True)
+        correction_term = P @ gradient
+    return correction_term, P
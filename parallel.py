@@ -0,0 +1,191 @@
+import numpy as np
+import multiprocessing
+from multiprocessing import shared_memory
+from ils import IteratedLeastSquares
+from typing import Callable
+
+
+def result_dtype(n_parameters: int):
+    """Structured dtype of one solve: estimate, covariance, iteration count and convergence flag"""
+    return np.dtype(
+        [
+            ("x_estimate", float, (n_parameters,)),
+            ("P", float, (n_parameters, n_parameters)),
+            ("iterations", np.int64),
+            ("converged", bool),
+        ]
+    )
+
+
+class SharedArrays:
+    """Numpy arrays copied once into named shared memory blocks
+
+    Only the (name, shape, dtype) specs are sent to worker processes, which map the same
+    memory with attach instead of receiving pickled copies of the arrays.
+    """
+
+    def __init__(self, **arrays):
+        self.blocks = {}
+        self.specs = {}
+        for key, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+            self.blocks[key] = block
+            self.specs[key] = (block.name, array.shape, array.dtype.str)
+
+    @staticmethod
+    def attach(specs):
+        """Map shared arrays from their specs, returns (arrays, blocks), keep blocks alive while in use"""
+        arrays, blocks = {}, []
+        for key, (name, shape, dtype) in specs.items():
+            block = shared_memory.SharedMemory(name=name)
+            arrays[key] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+            blocks.append(block)
+        return arrays, blocks
+
+    def close(self):
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_worker = {}
+
+
+def _init_worker(specs, settings):
+    """Pool initializer, attaches the shared arrays once per worker process"""
+    _worker["arrays"], _worker["blocks"] = SharedArrays.attach(specs)
+    _worker["settings"] = settings
+
+
+def _solve_window(arrays, settings, task):
+    """Fit one collection window [start, stop) of the shared measurement arrays"""
+    start, stop = arrays["windows"][task]
+    obj = IteratedLeastSquares(
+        initial_parameters=arrays["initial_parameters"][task][:, np.newaxis],
+        measurements=arrays["measurements"][start:stop][:, np.newaxis],
+        measurement_noise=settings["measurement_noise"],
+        tol=settings["tol"],
+        max_iterations=settings["max_iterations"],
+        model=settings["model"],
+        linearized_model=settings["linearized_model"],
+        method=settings["method"],
+        cost_tol=settings["cost_tol"],
+        verbose=False,
+    )
+    sensor_state = [arrays[key][start:stop] for key in settings["sensor_keys"]]
+    result = obj.solve_ils(*sensor_state)
+    return result.x_estimate[:, 0], result.P, result.iterations, result.converged
+
+
+def _solve_chunk(chunk):
+    """Solve tasks [first, last) in a worker, returns (first, structured results)"""
+    first, last = chunk
+    arrays, settings = _worker["arrays"], _worker["settings"]
+    results = np.zeros(last - first, dtype=result_dtype(settings["n_parameters"]))
+    for row, task in enumerate(range(first, last)):
+        results[row] = _solve_window(arrays, settings, task)
+    return first, results
+
+
+def solve_ils_parallel(
+    initial_parameters: np.ndarray,
+    measurements: np.ndarray,
+    windows: np.ndarray,
+    sensor_state: tuple,
+    measurement_noise: np.ndarray,
+    tol: float,
+    max_iterations: int,
+    model: Callable,
+    linearized_model: Callable,
+    workers: int = None,
+    chunk_size: int = None,
+    method: str = "gauss-newton",
+    cost_tol: float = None,
+):
+    """Run independent IteratedLeastSquares fits across a process pool
+
+    All collection windows share one set of flat arrays. Task i fits
+    measurements[windows[i, 0]:windows[i, 1]] against the same rows of every sensor state
+    array, for example (sat_position, sat_velocity) of shape (M, 3), starting from
+    initial_parameters[i]. The arrays are placed in shared memory once and tasks are sent
+    to workers as contiguous chunks of indices, results are written back by task index so
+    the output does not depend on the number of workers or scheduling order. model and
+    linearized_model must be picklable (module level functions). method and cost_tol are
+    passed through to IteratedLeastSquares.
+
+    Example Input and output
+    results = solve_ils_parallel(initial_parameters=x_naught [(T, n)],
+                                 measurements=z [(M,)],
+                                 windows=windows [(T, 2)],
+                                 sensor_state=(sat_position [(M, 3)], sat_velocity [(M, 3)]),
+                                 measurement_noise=np.array([sigma]),
+                                 tol=1e-3,
+                                 max_iterations=50,
+                                 model=model_equations.model_equation_rr,
+                                 linearized_model=jacobians.range_rate_jacobian,
+                                 workers=32)
+    results["x_estimate"] [(T, n)], results["P"] [(T, n, n)], results["iterations"], results["converged"]
+    """
+    initial_parameters = np.atleast_2d(np.asarray(initial_parameters, dtype=float))
+    windows = np.asarray(windows, dtype=np.int64).reshape(-1, 2)
+    if initial_parameters.shape[0] != windows.shape[0]:
+        raise ValueError("initial_parameters and windows must have one row per task")
+    if not callable(model):
+        raise ValueError("A model equation is required")
+    if not callable(linearized_model):
+        raise ValueError("A linearized model is required")
+    n_tasks, n_parameters = initial_parameters.shape
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if chunk_size is None:
+        chunk_size = max(1, -(-n_tasks // (workers * 8)))  # ~8 chunks per worker
+    arrays = dict(
+        initial_parameters=initial_parameters,
+        measurements=np.asarray(measurements, dtype=float).reshape(-1),
+        windows=windows,
+    )
+    sensor_keys = []
+    for i, state in enumerate(sensor_state):
+        sensor_keys.append(f"sensor_state_{i}")
+        arrays[sensor_keys[-1]] = np.asarray(state, dtype=float)
+    settings = dict(
+        measurement_noise=measurement_noise,
+        tol=tol,
+        max_iterations=max_iterations,
+        model=model,
+        linearized_model=linearized_model,
+        method=method,
+        cost_tol=cost_tol,
+        sensor_keys=sensor_keys,
+        n_parameters=n_parameters,
+    )
+    chunks = [
+        (first, min(first + chunk_size, n_tasks))
+        for first in range(0, n_tasks, chunk_size)
+    ]
+    results = np.zeros(n_tasks, dtype=result_dtype(n_parameters))
+    if workers == 1:
+        _worker.update(arrays=arrays, settings=settings)
+        try:
+            for first, chunk_results in map(_solve_chunk, chunks):
+                results[first : first + chunk_results.size] = chunk_results
+        finally:
+            _worker.clear()
+        return results
+
+    with SharedArrays(**arrays) as shared:
+        with multiprocessing.Pool(
+            workers, initializer=_init_worker, initargs=(shared.specs, settings)
+        ) as pool:
+            for first, chunk_results in pool.imap_unordered(_solve_chunk, chunks):
+                results[first : first + chunk_results.size] = chunk_results
+    return results
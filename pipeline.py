@@ -0,0 +1,333 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+class MeasurementChunk:
+    """Rows of measurements received together, e.g. one socket read of one sensor
+
+    time (m,), measurement (m,), noise (m,) sigmas and the sensor_state arrays with m
+    rows each, e.g. (sat_position (m, 3), sat_velocity (m, 3)). received holds the
+    time.perf_counter() at which each row entered the pipeline, for latency accounting,
+    and is None until the chunk is ingested.
+    """
+
+    __slots__ = ("time", "measurement", "noise", "sensor_state", "received")
+
+    def __init__(self, time, measurement, noise, sensor_state, received=None):
+        self.time = np.asarray(time, dtype=float).reshape(-1)
+        m = self.time.size
+        self.measurement = np.asarray(measurement, dtype=float).reshape(m)
+        self.noise = np.broadcast_to(np.asarray(noise, dtype=float).reshape(-1), (m,))
+        self.sensor_state = tuple(np.asarray(state, dtype=float) for state in sensor_state)
+        self.received = received
+
+    @classmethod
+    def _from_arrays(cls, time, measurement, noise, sensor_state, received):
+        """Chunk from already validated arrays, skips the conversions of __init__"""
+        chunk = cls.__new__(cls)
+        chunk.time = time
+        chunk.measurement = measurement
+        chunk.noise = noise
+        chunk.sensor_state = sensor_state
+        chunk.received = received
+        return chunk
+
+    def __len__(self):
+        return self.time.size
+
+    def take(self, rows):
+        """Chunk of the selected rows (index array, mask or slice, slices give views)"""
+        return MeasurementChunk._from_arrays(
+            self.time[rows],
+            self.measurement[rows],
+            self.noise[rows],
+            tuple(state[rows] for state in self.sensor_state),
+            None if self.received is None else self.received[rows],
+        )
+
+    def sorted(self):
+        """The chunk in time order, itself when already ordered"""
+        if np.all(self.time[1:] >= self.time[:-1]):
+            return self
+        return self.take(np.argsort(self.time, kind="stable"))
+
+    @staticmethod
+    def concatenate(chunks):
+        if len(chunks) == 1:
+            return chunks[0]
+        return MeasurementChunk._from_arrays(
+            np.concatenate([chunk.time for chunk in chunks]),
+            np.concatenate([chunk.measurement for chunk in chunks]),
+            np.concatenate([chunk.noise for chunk in chunks]),
+            tuple(
+                np.concatenate(states)
+                for states in zip(*(chunk.sensor_state for chunk in chunks))
+            ),
+            None
+            if any(chunk.received is None for chunk in chunks)
+            else np.concatenate([chunk.received for chunk in chunks]),
+        )
+
+
+async def simulated_source(
+    time, measurement, noise, *sensor_state, chunk_size=64, rate=None, jitter=0.0, seed=0
+):
+    """Local stand in for a live sensor stream, yields MeasurementChunks
+
+    Rows are delivered chunk_size at a time, paced to rate rows per second of wall time
+    when given (as fast as the consumer accepts them otherwise). jitter shuffles rows
+    within chunks of the stream so they arrive out of time order, as from a sensor whose
+    messages take different network paths.
+    """
+    time = np.asarray(time, dtype=float)
+    order = np.arange(time.size)
+    if jitter:
+        rng = np.random.default_rng(seed)
+        order = np.argsort(time + rng.uniform(0, jitter, time.size), kind="stable")
+    start = asyncio.get_running_loop().time()
+    for first in range(0, time.size, chunk_size):
+        # sleep(0) when behind still lets the other sources run, as concurrent sensors would
+        delay = start + first / rate - asyncio.get_running_loop().time() if rate else 0
+        await asyncio.sleep(max(delay, 0))
+        rows = order[first : first + chunk_size]
+        yield MeasurementChunk(
+            time[rows],
+            np.asarray(measurement)[rows],
+            np.broadcast_to(noise, time.shape)[rows],
+            [np.asarray(state)[rows] for state in sensor_state],
+        )
+
+
+async def stream_source(reader, state_columns=(3, 3), read_size=65_536):
+    """MeasurementChunks parsed from an asyncio.StreamReader, e.g. a socket connection
+
+    Each line is comma separated time, measurement, noise and the sensor state columns
+    (by default sensor x, y, z and vx, vy, vz), every read becomes one chunk.
+    """
+    splits = np.cumsum(state_columns)[:-1]
+    remainder = b""
+    while True:
+        data = await reader.read(read_size)
+        lines = (remainder + data).split(b"\n")
+        # the partial last line waits for the next read, at EOF it is the final row
+        remainder = lines.pop() if data else b""
+        rows = np.array([line.split(b",") for line in lines if line.strip()], dtype=float)
+        if rows.size:
+            yield MeasurementChunk(
+                rows[:, 0],
+                rows[:, 1],
+                rows[:, 2],
+                np.split(rows[:, 3:], splits, axis=1),
+            )
+        if not data:
+            break
+
+
+class IngestionPipeline:
+    """Asynchronous ingest -> time align -> micro-batch -> EKF update pipeline
+
+    Every source (an async iterable of MeasurementChunks, e.g. simulated_source or
+    stream_source) is read by its own ingest task. Stages are joined by bounded queues of
+    queue_size chunks, so a slow filter blocks batching, alignment and finally the
+    sources instead of letting memory grow.
+
+    The aligner releases rows in time order once every live source has reported a later
+    time than them by reorder_window seconds, rows older than the last released time
+    arrive too late and are counted and dropped. A source that stops reporting holds the
+    others back until max_pending rows are waiting, which are then released together.
+    The batcher takes everything already aligned (waiting until tick seconds after the
+    previous update when tick > 0) up to max_batch rows, and the filter stage runs one
+    micro-batch ExtendedKalmanFilter.update per batch in a single worker thread so the
+    event loop keeps ingesting while the numerics run.
+
+    Example Input and output
+    filter = ExtendedKalmanFilter(x_naught, P_naught, None, np.array([sigma]), 0.95,
+                                  model_equations.model_equation_rr,
+                                  jacobians.range_rate_jacobian)
+    pipeline = IngestionPipeline(filter, [simulated_source(t, z, sigma, position, velocity,
+                                                           rate=50_000)])
+    stats = asyncio.run(pipeline.run())
+    stats["latency_median_s"], filter.initial_parameters
+    """
+
+    def __init__(
+        self,
+        ekf,
+        sources,
+        reorder_window: float = 0.0,
+        tick: float = 0.0,
+        max_batch: int = 512,
+        queue_size: int = 64,
+        max_pending: int = 65_536,
+        executor=None,
+        on_estimate=None,
+    ):
+        """
+        Args:
+            ekf (ExtendedKalmanFilter): filter updated in place with each micro-batch
+            sources (list): async iterables of MeasurementChunk
+            reorder_window (float): measurement time a row is held back for late arrivals
+            tick (float): minimum wall time between filter updates, 0 updates as soon as possible
+            max_batch (int): most rows in one filter update
+            queue_size (int): capacity in chunks of each inter-stage queue
+            max_pending (int): rows the aligner may hold, beyond it every held row is released
+            executor: executor for the filter updates, a private single thread by default
+            on_estimate (Callable): on_estimate(x_estimate, P, batch) after every update
+        """
+        if max_batch < 1:
+            raise ValueError("max_batch must be positive")
+        self.ekf = ekf
+        self.sources = list(sources)
+        self.reorder_window = reorder_window
+        self.tick = tick
+        self.max_batch = max_batch
+        self.queue_size = queue_size
+        self.max_pending = max_pending
+        self.executor = executor
+        self.on_estimate = on_estimate
+        self.messages = 0
+        self.late = 0
+        self.updates = 0
+        self._latencies = []
+
+    async def _ingest(self, index, source, queue):
+        clock = time.perf_counter
+        async for chunk in source:
+            chunk.received = np.full(len(chunk), clock())
+            await queue.put((index, chunk))
+        await queue.put((index, None))
+
+    async def _align(self, ingested, aligned):
+        latest = {index: -np.inf for index in range(len(self.sources))}
+        pending = []  # time ordered chunks, each held until the watermark passes it
+        pending_rows = 0
+        released = -np.inf
+        while latest:
+            index, chunk = await ingested.get()
+            if chunk is None:
+                del latest[index]
+            elif len(chunk):
+                self.messages += len(chunk)
+                chunk = chunk.sorted()
+                latest[index] = max(latest[index], chunk.time[-1])
+                pending.append(chunk)
+                pending_rows += len(chunk)
+            if not pending:
+                continue
+            watermark = min(latest.values(), default=np.inf) - self.reorder_window
+            if pending_rows > self.max_pending:  # a stalled source must not hold rows forever
+                watermark = np.inf
+            ready, held = [], []
+            for chunk in pending:
+                if chunk.time[0] > watermark:
+                    held.append(chunk)
+                    continue
+                if chunk.time[-1] <= watermark:
+                    ready.append(chunk)
+                    continue
+                split = int(np.searchsorted(chunk.time, watermark, side="right"))
+                ready.append(chunk.take(slice(split)))
+                if split < len(chunk):
+                    held.append(chunk.take(slice(split, None)))
+            if not ready:
+                continue
+            pending = held
+            out = MeasurementChunk.concatenate(ready)
+            pending_rows -= len(out)
+            if len(ready) > 1:
+                out = out.sorted()
+            on_time = out.time >= released
+            if not on_time.all():
+                self.late += int(np.count_nonzero(~on_time))
+                out = out.take(on_time)
+            if len(out):
+                released = out.time[-1]
+                await aligned.put(out)
+        await aligned.put(None)
+
+    async def _batch(self, aligned, batches):
+        loop = asyncio.get_running_loop()
+        next_update = loop.time()
+        finished = False
+        while not finished:
+            chunk = await aligned.get()
+            if chunk is None:
+                break
+            chunks, rows = [chunk], len(chunk)
+            if self.tick:
+                delay = next_update - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                next_update = loop.time() + self.tick
+            while rows < self.max_batch and not aligned.empty():
+                chunk = aligned.get_nowait()
+                if chunk is None:
+                    finished = True
+                    break
+                chunks.append(chunk)
+                rows += len(chunk)
+            batch = MeasurementChunk.concatenate(chunks)
+            for first in range(0, len(batch), self.max_batch):
+                await batches.put(batch.take(slice(first, first + self.max_batch)))
+        await batches.put(None)
+
+    def _update(self, batch):
+        x_estimate, P = self.ekf.update(
+            batch.measurement, batch.noise, *batch.sensor_state
+        )
+        return x_estimate, P, time.perf_counter() - batch.received
+
+    async def _filter(self, batches, executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await batches.get()
+            if batch is None:
+                break
+            x_estimate, P, latency = await loop.run_in_executor(
+                executor, self._update, batch
+            )
+            self.updates += 1
+            self._latencies.append(latency)
+            if self.on_estimate is not None:
+                self.on_estimate(x_estimate, P, batch)
+
+    async def run(self):
+        """Run until every source is exhausted and all rows are filtered, returns stats()"""
+        ingested = asyncio.Queue(self.queue_size)
+        aligned = asyncio.Queue(self.queue_size)
+        batches = asyncio.Queue(self.queue_size)
+        executor = self.executor or ThreadPoolExecutor(max_workers=1)
+        tasks = [
+            asyncio.create_task(self._ingest(index, source, ingested))
+            for index, source in enumerate(self.sources)
+        ]
+        tasks += [
+            asyncio.create_task(self._align(ingested, aligned)),
+            asyncio.create_task(self._batch(aligned, batches)),
+            asyncio.create_task(self._filter(batches, executor)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:  # a failed stage would leave the others blocked on queues
+                task.cancel()
+            if self.executor is None:
+                executor.shutdown(wait=False)
+        return self.stats()
+
+    def stats(self):
+        """Row counts and measurement to estimate latency percentiles in seconds"""
+        latencies = (
+            np.concatenate(self._latencies) if self._latencies else np.full(1, np.nan)
+        )
+        return {
+            "messages": self.messages,
+            "filtered": int(latencies.size) if self._latencies else 0,
+            "late": self.late,
+            "updates": self.updates,
+            "mean_batch": latencies.size / max(self.updates, 1),
+            "latency_median_s": float(np.median(latencies)),
+            "latency_p99_s": float(np.percentile(latencies, 99)),
+        }
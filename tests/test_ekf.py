@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+import coordinate_transforms
+import ekf
+import jacobians
+import model_equations
+
+
+def range_rate_batch(m=64, seed=0):
+    rng = np.random.default_rng(seed)
+    emitter = coordinate_transforms.geodetic_to_ecef(35.0, -77.0, 0.0)
+    sensor_position = emitter + rng.normal(0, 2e4, (m, 3)) + np.array([0, 0, 9e3])
+    sensor_velocity = rng.normal(0, 200, (m, 3))
+    z = model_equations.model_equation_rr(emitter, sensor_position, sensor_velocity)
+    return emitter, z + rng.normal(0, 0.05, m), sensor_position, sensor_velocity
+
+
+def make_filter(x, P):
+    return ekf.ExtendedKalmanFilter(
+        x,
+        P,
+        None,
+        np.array([0.05]),
+        0.95,
+        model_equations.model_equation_rr,
+        jacobians.range_rate_jacobian,
+    )
+
+
+def test_information_form_matches_gain_form():
+    emitter, z, s, v = range_rate_batch()
+    x = emitter + np.array([300.0, -200.0, 0.0])
+    information = make_filter(x, np.eye(3) * 1e4)
+    gain = make_filter(x, np.eye(3) * 1e4)
+    x_information, P_information = information.update(z, None, s, v)
+    x_gain, P_gain = gain.update(z, np.eye(z.size) * 0.05**2, s, v)  # dense R, gain form
+    np.testing.assert_allclose(x_information, x_gain, atol=1e-6)
+    np.testing.assert_allclose(P_information, P_gain, rtol=1e-8, atol=1e-12)
+
+
+def test_batch_update_with_singular_prior():
+    emitter, z, s, v = range_rate_batch()
+    x = emitter + np.array([300.0, -200.0, 0.0])
+    P = np.diag([1e6, 1e6, 0.0])  # altitude held exactly
+    x_update, P_update = make_filter(x, P).update(z, None, s, v)
+    assert np.all(np.isfinite(P_update))
+    assert x_update[2] == x[2]
+    np.testing.assert_allclose(P_update[2], 0.0, atol=1e-12)
+    assert np.linalg.eigvalsh(P_update).min() > -1e-9
+
+
+def test_bank_rejects_tracks_that_are_not_active():
+    emitter, z, s, v = range_rate_batch(m=8)
+    bank = ekf.ExtendedKalmanFilterBank(
+        3,
+        np.array([0.05]),
+        0.95,
+        model_equations.model_equation_rr,
+        jacobians.range_rate_jacobian,
+        capacity=4,
+    )
+    first = bank.add(emitter + 100.0, np.eye(3) * 1e6)
+    second = bank.add(emitter - 100.0, np.eye(3) * 1e6)
+    bank.remove(second)
+    P = bank.P.copy()
+    for tracks in ([second], [first, 7], [-1], [first, first], [0.0]):
+        with pytest.raises(ValueError):
+            bank.predict(np.eye(3), tracks)
+        with pytest.raises(ValueError):
+            bank.update(tracks, z[np.newaxis], None, s[np.newaxis], v[np.newaxis])
+    with pytest.raises(ValueError):
+        bank.predict(np.eye(3), np.ones(5, dtype=bool))
+    np.testing.assert_array_equal(bank.P, P)
+    # a mask skips inactive slots instead of raising
+    bank.predict(np.eye(3), np.ones(4, dtype=bool))
+    np.testing.assert_array_equal(bank.P[first], P[first] + np.eye(3))
+    x_update, _ = bank.update([first], z[np.newaxis], None, s[np.newaxis], v[np.newaxis])
+    assert x_update.shape == (1, 3)
+    # a tick without measurements leaves every filter untouched
+    x, P = bank.x.copy(), bank.P.copy()
+    for tracks in (np.zeros(4, dtype=bool), []):
+        x_update, P_update = bank.update(
+            tracks, np.empty((0, 8)), None, np.empty((0, 8, 3)), np.empty((0, 8, 3))
+        )
+        assert x_update.shape == (0, 3) and P_update.shape == (0, 3, 3)
+    np.testing.assert_array_equal(bank.x, x)
+    np.testing.assert_array_equal(bank.P, P)
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+import fusion
+import jacobians
+from test_ils import range_rate_pass
+
+
+def test_modality_without_parameters_is_rejected():
+    obj = fusion.MeasurementFusion(n_parameters=3)
+    with pytest.raises(ValueError, match="no parameters"):
+        obj.add("rr", jacobians.model_and_jacobian_rr, [1.0], 0.05, [])
+    with pytest.raises(ValueError, match="outside"):
+        obj.add("rr", jacobians.model_and_jacobian_rr, [1.0], 0.05, [-1, 0, 1])
+    with pytest.raises(ValueError, match="No measurement types"):
+        obj.noise_model()
+
+
+def test_stacked_passes_match_separate_modalities():
+    emitter, position, velocity, z = range_rate_pass(n=200)
+    halves = np.array_split(np.arange(z.size), 2)
+    separate = fusion.MeasurementFusion(n_parameters=3)
+    for rows in halves:
+        separate.add(
+            "rr",
+            jacobians.model_and_jacobian_rr,
+            z[rows],
+            0.05,
+            [0, 1, 2],
+            position[rows],
+            velocity[rows],
+        )
+    stacked = fusion.MeasurementFusion(n_parameters=3).add(
+        "rr", jacobians.model_and_jacobian_rr, z, 0.05, [0, 1, 2], position, velocity
+    )
+    x = emitter + 150.0
+    for expected, actual in zip(separate(x), stacked(x)):
+        np.testing.assert_allclose(actual, expected)
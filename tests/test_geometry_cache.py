@@ -0,0 +1,100 @@
+import numpy as np
+import coordinate_transforms
+import geometry_cache
+import model_equations
+from geometry_cache import DEFAULT_CACHE
+
+
+def test_scalar_conversions_bypass_the_cache_unless_asked():
+    DEFAULT_CACHE.clear()
+    for latitude in np.linspace(-80, 80, 50):
+        coordinate_transforms.geodetic_to_ecef(float(latitude), 10.0, 0.0)
+        coordinate_transforms.enu_rotation_matrix(float(latitude), 10.0)
+    assert len(DEFAULT_CACHE) == 0
+    first = coordinate_transforms.geodetic_to_ecef(35.0, -77.0, 10.0, cache=True)
+    second = coordinate_transforms.geodetic_to_ecef(35.0, -77.0, 10.0, cache=True)
+    assert DEFAULT_CACHE.hits == 1
+    second[0] = 0.0  # callers get copies, not the cached array
+    np.testing.assert_array_equal(
+        coordinate_transforms.geodetic_to_ecef(35.0, -77.0, 10.0, cache=True), first
+    )
+    DEFAULT_CACHE.clear()
+
+
+def test_local_frame_uses_site_cache():
+    DEFAULT_CACHE.clear()
+    coordinate_transforms.LocalFrame(35.0, -77.0, 10.0)
+    frame = coordinate_transforms.LocalFrame(35.0, -77.0, 10.0)
+    assert DEFAULT_CACHE.hits == 2
+    np.testing.assert_allclose(
+        frame.observer_ecef, coordinate_transforms.geodetic_to_ecef(35.0, -77.0, 10.0)
+    )
+    DEFAULT_CACHE.clear()
+
+
+def test_budget_covers_per_entry_overhead():
+    import gc
+    import tracemalloc
+
+    cache = geometry_cache.GeometryCache(max_bytes=2 * 2**20)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for i in range(50_000):
+            site = (float(i), 1.0, 2.0)
+            cache.get(("geodetic_to_ecef", site), lambda: np.array([1.0, 2.0, 3.0]))
+        held, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert cache.evictions > 0
+    assert cache.bytes <= cache.max_bytes
+    assert held < 1.1 * cache.max_bytes
+
+
+def test_concurrent_gets_keep_accounting_consistent():
+    import threading
+
+    cache = geometry_cache.GeometryCache(max_bytes=64 * 1024)
+
+    def worker(seed):
+        rng = np.random.default_rng(seed)
+        for key in rng.integers(0, 500, 5_000):
+            cache.get(("site", int(key)), lambda: np.zeros(4))
+            if key % 97 == 0:
+                cache.evict(int(key))
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.bytes == sum(entry[1] for entry in cache._entries.values())
+    assert cache.bytes <= cache.max_bytes
+
+
+def test_track_id_is_reused_until_evicted_or_versioned():
+    rng = np.random.default_rng(0)
+    emitter = coordinate_transforms.geodetic_to_ecef(35.0, -77.0, 0.0)
+    position = emitter + rng.normal(0, 2e4, (128, 3))
+    velocity = rng.normal(0, 200, (128, 3))
+    direct = model_equations.model_equation_rr(emitter, position, velocity)
+    for version in range(2):  # one id per micro-batch of a stream
+        batch = slice(64 * version, 64 * version + 64)
+        np.testing.assert_allclose(
+            model_equations.model_equation_rr(
+                emitter, position[batch], velocity[batch], track_id=("stream", version)
+            ),
+            direct[batch],
+            rtol=1e-9,
+        )
+        DEFAULT_CACHE.evict(("stream", version))
+    model_equations.model_equation_rr(emitter, position, velocity, track_id="pass")
+    moved = position + 500.0
+    # the contents are not checked, the track must be evicted once its arrays change
+    DEFAULT_CACHE.evict("pass")
+    np.testing.assert_allclose(
+        model_equations.model_equation_rr(emitter, moved, velocity, track_id="pass"),
+        model_equations.model_equation_rr(emitter, moved, velocity),
+        rtol=1e-9,
+    )
+    DEFAULT_CACHE.evict("pass")
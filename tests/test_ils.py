@@ -0,0 +1,282 @@
+import numpy as np
+import pytest
+import coordinate_transforms
+import ils
+import jacobians
+import model_equations
+
+
+def range_rate_pass(n=400, sigma=0.05, seed=0, turn=1e-3):
+    rng = np.random.default_rng(seed)
+    emitter = coordinate_transforms.geodetic_to_ecef(35.0, -77.0, 0.0)
+    site = coordinate_transforms.LocalFrame(35.1, -77.1, 0.0)
+    heading = np.arange(n) * turn  # radians per sample of a 20 km circle
+    position = site.to_ecef(
+        np.column_stack(
+            [2e4 * np.cos(heading), 2e4 * np.sin(heading), np.full(n, 9e3)]
+        )
+    )
+    velocity = 200.0 * np.column_stack([-np.sin(heading), np.cos(heading), np.zeros(n)])
+    velocity = velocity @ site.R
+    z = model_equations.model_equation_rr(emitter, position, velocity)
+    return emitter, position, velocity, z + rng.normal(0, sigma, n)
+
+
+@pytest.mark.parametrize("method", ["gauss-newton", "levenberg-marquardt"])
+def test_fused_and_separate_models_give_the_same_covariance(method):
+    emitter, position, velocity, z = range_rate_pass()
+    common = dict(
+        initial_parameters=(emitter + np.array([300.0, -200.0, 0.0]))[:, np.newaxis],
+        measurements=z[:, np.newaxis],
+        measurement_noise=np.array([0.05]),
+        tol=1e-3,
+        max_iterations=50,
+        method=method,
+    )
+    separate = ils.IteratedLeastSquares(
+        model=model_equations.model_equation_rr,
+        linearized_model=jacobians.range_rate_jacobian,
+        **common,
+    ).solve_ils(position, velocity)
+    fused = ils.IteratedLeastSquares(
+        model_and_jacobian=jacobians.model_and_jacobian_rr, **common
+    ).solve_ils(position, velocity)
+    assert separate.converged and fused.converged
+    np.testing.assert_allclose(separate.x_estimate, fused.x_estimate, atol=1e-6)
+    np.testing.assert_allclose(separate.P, fused.P, rtol=1e-9)
+    H = jacobians.range_rate_jacobian(separate.x_estimate, position, velocity) / 0.05
+    np.testing.assert_allclose(separate.P, np.linalg.inv(H.T @ H), rtol=1e-9)
+
+
+def test_convergence_message_is_logged_not_printed(caplog, capsys):
+    emitter, position, velocity, z = range_rate_pass(n=50)
+    obj = ils.IteratedLeastSquares(
+        initial_parameters=(emitter + 100.0)[:, np.newaxis],
+        measurements=z[:, np.newaxis],
+        measurement_noise=np.array([0.05]),
+        tol=1e-3,
+        max_iterations=50,
+        model_and_jacobian=jacobians.model_and_jacobian_rr,
+    )
+    with caplog.at_level("DEBUG", logger="ils"):
+        result = obj.solve_ils(position, velocity)
+    assert capsys.readouterr().out == ""
+    assert [(r.levelname, r.getMessage()) for r in caplog.records] == [
+        ("DEBUG", result.message)
+    ]
+    obj.verbose = True
+    caplog.clear()
+    with caplog.at_level("INFO", logger="ils"):
+        obj.solve_ils(position, velocity)
+    assert [r.levelname for r in caplog.records] == ["INFO"]
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_doa_seeded_on_a_sensor_returns_a_failed_result():
+    sensors = np.array([[0.0, 0.0], [1e4, 0.0], [0.0, 1e4], [1e4, 1e4]])
+    target = np.array([3e3, 7e3])
+    z = np.arctan2(target[1] - sensors[:, 1], target[0] - sensors[:, 0]) + 0.01
+    result = ils.IteratedLeastSquares(
+        initial_parameters=np.array([[0.0], [0.0], [0.0]]),
+        measurements=z[:, np.newaxis],
+        measurement_noise=np.array([1e-3]),
+        tol=1e-3,
+        max_iterations=50,
+        model_and_jacobian=jacobians.model_and_jacobian_doa_bias,
+    ).solve_ils(sensors)
+    assert not result.converged
+    assert "not finite" in result.message
+    np.testing.assert_array_equal(result.x_estimate, np.zeros((3, 1)))
+    assert np.isnan(result.P).all()
+
+
+def cube_until_five(x, t):
+    x = x.item()
+    if x > 5:
+        return np.full(t.size, np.nan), np.full((t.size, 1), np.nan)
+    return t * x**3, (3 * t * x**2)[:, np.newaxis]
+
+
+@pytest.mark.parametrize("method", ["gauss-newton", "levenberg-marquardt"])
+def test_non_finite_trial_steps(method):
+    t = np.linspace(1.0, 2.0, 10)
+    result = ils.IteratedLeastSquares(
+        initial_parameters=np.array([[1.0]]),
+        measurements=(t * 4.0**3)[:, np.newaxis],
+        measurement_noise=np.array([1.0]),
+        tol=1e-8,
+        max_iterations=100,
+        model_and_jacobian=cube_until_five,
+        method=method,
+    ).solve_ils(t)
+    assert np.isfinite(result.x_estimate).all() and np.isfinite(result.P).all()
+    if method == "gauss-newton":  # the first step jumps past 5
+        assert not result.converged and "non-finite" in result.message
+        assert result.x_estimate.item() == 1.0
+    else:  # rejected, the damped steps stay finite
+        assert result.converged
+        np.testing.assert_allclose(result.x_estimate.item(), 4.0)
+
+
+def batched_range_rate_problems(B=4, n=200):
+    emitter, position, velocity, _ = range_rate_pass(n=n)
+    rng = np.random.default_rng(2)
+    emitters = emitter + rng.normal(0, 2e3, (B, 3)) * np.array([1.0, 1.0, 0.0])
+    positions = np.broadcast_to(position, (B, n, 3)).copy()
+    velocities = np.broadcast_to(velocity, (B, n, 3)).copy()
+    z = model_equations.model_equation_rr(emitters, positions, velocities)
+    z = z + rng.normal(0, 0.05, z.shape)
+    x_naught = emitters + rng.normal(0, 300.0, (B, 3)) * np.array([1.0, 1.0, 0.0])
+    return x_naught, z, positions, velocities
+
+
+def test_batched_matches_a_loop_of_single_solves():
+    x_naught, z, positions, velocities = batched_range_rate_problems()
+    x_estimate, P, iterations, converged = ils.BatchedIteratedLeastSquares(
+        initial_parameters=x_naught,
+        measurements=z,
+        measurement_noise=0.05,
+        tol=1e-3,
+        max_iterations=50,
+        model=model_equations.model_equation_rr,
+        linearized_model=jacobians.range_rate_jacobian,
+    ).solve_ils(positions, velocities)
+    assert converged.all()
+    for b in range(z.shape[0]):
+        single = ils.IteratedLeastSquares(
+            initial_parameters=x_naught[b][:, np.newaxis],
+            measurements=z[b][:, np.newaxis],
+            measurement_noise=np.array([0.05]),
+            tol=1e-3,
+            max_iterations=50,
+            model=model_equations.model_equation_rr,
+            linearized_model=jacobians.range_rate_jacobian,
+        ).solve_ils(positions[b], velocities[b])
+        assert single.converged and single.iterations == iterations[b]
+        np.testing.assert_allclose(x_estimate[b], single.x_estimate[:, 0], atol=1e-6)
+        np.testing.assert_allclose(P[b], single.P, rtol=1e-4)
+
+
+def test_batched_stops_updating_converged_problems():
+    x_naught, z, positions, velocities = batched_range_rate_problems()
+    evaluated = []
+
+    def model(x, position, velocity):
+        evaluated.append(x.copy())
+        return model_equations.model_equation_rr(x, position, velocity)
+
+    obj = ils.BatchedIteratedLeastSquares(
+        initial_parameters=x_naught,
+        measurements=z,
+        measurement_noise=0.05,
+        tol=1e-3,
+        max_iterations=50,
+        model=model,
+        linearized_model=jacobians.range_rate_jacobian,
+    )
+    x_estimate, _, iterations, converged = obj.solve_ils(positions, velocities)
+    assert converged.all()
+    # one model call per iteration, only for the problems still iterating
+    assert [x.shape[0] for x in evaluated] == [
+        int((iterations > i).sum()) for i in range(iterations.max())
+    ]
+    # a converged problem keeps the estimate of its final step
+    first = int(np.argmin(iterations))
+    alone = ils.BatchedIteratedLeastSquares(
+        initial_parameters=x_naught[first : first + 1],
+        measurements=z[first : first + 1],
+        measurement_noise=0.05,
+        tol=1e-3,
+        max_iterations=int(iterations[first]),
+        model=model_equations.model_equation_rr,
+        linearized_model=jacobians.range_rate_jacobian,
+    ).solve_ils(positions[first : first + 1], velocities[first : first + 1])[0]
+    np.testing.assert_array_equal(x_estimate[first], alone[0])
+
+
+def full_window_fit(model_and_jacobian, x_naught, z, sigma, *sensor_state):
+    """IteratedLeastSquares over flattened samples, the reference for the window"""
+    n = x_naught.size
+
+    def flattened(x, *state):
+        predicted, H = model_and_jacobian(x, *state)
+        return np.reshape(predicted, -1), np.reshape(H, (-1, n))
+
+    return ils.IteratedLeastSquares(
+        initial_parameters=x_naught.reshape(-1, 1),
+        measurements=np.reshape(z, (-1, 1)),
+        measurement_noise=np.array([sigma]),
+        tol=1e-6,
+        max_iterations=50,
+        model_and_jacobian=flattened,
+    ).solve_ils(*sensor_state)
+
+
+def test_sliding_window_matches_a_full_fit_of_the_final_window():
+    # every window spans a third of a turn, so the emitter is observed in each
+    emitter, position, velocity, z = range_rate_pass(n=1000, turn=7e-3)
+    x_naught = emitter + np.array([300.0, -200.0, 0.0])
+    window = ils.SlidingWindowLeastSquares(
+        initial_parameters=x_naught,
+        window_size=300,
+        measurement_noise=np.array([0.05]),
+        tol=1e-6,
+        max_iterations=20,
+        model_and_jacobian=jacobians.model_and_jacobian_rr,
+    )
+    for rows in np.array_split(np.arange(z.size), 13):  # slides 2.3 windows
+        x_estimate, P = window.update(z[rows], position[rows], velocity[rows])
+    final = slice(z.size - 300, None)
+    reference = full_window_fit(
+        jacobians.model_and_jacobian_rr,
+        x_naught,
+        z[final],
+        0.05,
+        position[final],
+        velocity[final],
+    )
+    assert reference.converged
+    np.testing.assert_allclose(x_estimate, reference.x_estimate, atol=1e-4)
+    np.testing.assert_allclose(P, reference.P, rtol=1e-5)
+    # a chunk longer than the window keeps only its newest window_size samples
+    x_estimate, P = window.update(z, position, velocity)
+    assert window.count == 300
+    np.testing.assert_allclose(x_estimate, reference.x_estimate, atol=1e-4)
+    np.testing.assert_allclose(P, reference.P, rtol=1e-5)
+
+
+def test_sliding_window_tdoa_epochs():
+    rng = np.random.default_rng(3)
+    emitter = coordinate_transforms.geodetic_to_ecef(35.0, -77.0, 0.0)
+    site = coordinate_transforms.LocalFrame(35.0, -77.0, 0.0)
+    epochs, sensors = 200, 4
+    heading = np.linspace(0.0, 2.0, epochs)[:, np.newaxis] + np.arange(sensors) * 1.5
+    radius = np.array([2e4, 3e4, 4e4, 5e4])
+    altitude = np.broadcast_to(np.array([8e3, 9e3, 1e4, 1.1e4]), heading.shape)
+    local = np.stack(
+        [radius * np.cos(heading) + 1e4, radius * np.sin(heading), altitude], axis=-1
+    )
+    sensor_positions = site.to_ecef(local.reshape(-1, 3)).reshape(epochs, sensors, 3)
+    z, _ = jacobians.model_and_jacobian_range_difference(emitter, sensor_positions)
+    z = z + rng.normal(0, 5.0, z.shape)  # (epochs, k = sensors - 1)
+    x_naught = emitter + np.array([2e3, -1e3, 500.0])
+    window = ils.SlidingWindowLeastSquares(
+        initial_parameters=x_naught,
+        window_size=50,
+        measurement_noise=np.array([5.0]),
+        tol=1e-6,
+        max_iterations=20,
+        model_and_jacobian=jacobians.model_and_jacobian_range_difference,
+    )
+    for rows in np.array_split(np.arange(epochs), 9):
+        x_estimate, P = window.update(z[rows], sensor_positions[rows])
+    reference = full_window_fit(
+        jacobians.model_and_jacobian_range_difference,
+        x_naught,
+        z[-50:],
+        5.0,
+        sensor_positions[-50:],
+    )
+    assert reference.converged
+    np.testing.assert_allclose(x_estimate, reference.x_estimate, atol=1e-3)
+    np.testing.assert_allclose(P, reference.P, rtol=1e-5)
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+import coordinate_transforms
+import foa
+import jacobians
+import model_equations
+
+
+def finite_difference(model, x, step):
+    """Central difference jacobian (N, n) of a model returning (N,) at x (n,)"""
+    x = np.asarray(x, dtype=float)
+    columns = []
+    for i in range(x.size):
+        dx = np.zeros_like(x)
+        dx[i] = step[i] if np.ndim(step) else step
+        columns.append((model(x + dx) - model(x - dx)) / (2 * dx[i]))
+    return np.stack(columns, axis=-1)
+
+
+@pytest.fixture
+def geometry():
+    rng = np.random.default_rng(0)
+    emitter = coordinate_transforms.geodetic_to_ecef(35.0, -77.0, 0.0)
+    sensor_position = emitter + rng.normal(0, 3e4, (20, 3)) + np.array([0, 0, 9e3])
+    sensor_velocity = rng.normal(0, 200, (20, 3))
+    return emitter + np.array([500.0, -300.0, 50.0]), sensor_position, sensor_velocity
+
+
+def test_range_rate_jacobian(geometry):
+    x, s, v = geometry
+    expected = finite_difference(
+        lambda p: model_equations.model_equation_rr(p, s, v), x, 1.0
+    )
+    np.testing.assert_allclose(
+        jacobians.range_rate_jacobian(x, s, v), expected, rtol=1e-5, atol=1e-10
+    )
+    predicted, H = jacobians.model_and_jacobian_rr(x, s, v)
+    np.testing.assert_allclose(predicted, model_equations.model_equation_rr(x, s, v))
+    np.testing.assert_allclose(H, expected, rtol=1e-5, atol=1e-10)
+
+
+def test_foa_jacobian(geometry):
+    x, s, v = geometry
+    x = np.append(x, 9.4e9)
+    expected = finite_difference(
+        lambda p: model_equations.model_equation_foa(p, s, v), x, [20.0, 20.0, 20.0, 1e3]
+    )  # predictions are ~1e10 Hz, wide steps keep round off out of the differences
+    np.testing.assert_allclose(
+        jacobians.jacobian_foa(x, s, v), expected, rtol=1e-4, atol=1e-7
+    )
+
+
+def test_frequency_of_arrival_jacobian(geometry):
+    x, s, v = geometry
+    channels = np.arange(s.shape[0]) % 2
+    engine = foa.FrequencyOfArrival(s, v, channels=channels)
+    x = np.concatenate([x, [9.4e9, 2.2e9]])
+    expected = finite_difference(engine.model, x, [20.0, 20.0, 20.0, 1e3, 1e3])
+    np.testing.assert_allclose(engine.jacobian(x), expected, rtol=1e-4, atol=1e-7)
+
+
+@pytest.mark.parametrize("reference", [0, 3, "pairwise"])
+def test_range_difference_jacobian(geometry, reference):
+    x, s, _ = geometry
+    expected = finite_difference(
+        lambda p: model_equations.model_equation_range_difference(p, s, reference),
+        x,
+        1.0,
+    )
+    np.testing.assert_allclose(
+        jacobians.jacobian_range_difference(x, s, reference),
+        expected,
+        rtol=1e-5,
+        atol=1e-9,
+    )
+
+
+def test_doa_jacobian(geometry):
+    x, s, _ = geometry
+    x = x[:2]
+    predicted, H = jacobians.model_and_jacobian_doa(x, s[:, :2])
+    expected = finite_difference(
+        lambda p: model_equations.model_equation_doa(p, s[:, :2]), x, 1.0
+    )
+    np.testing.assert_allclose(H[:, :2], expected, rtol=1e-5, atol=1e-12)
+    np.testing.assert_allclose(H[:, 2], 1.0)
+    np.testing.assert_allclose(predicted, model_equations.model_equation_doa(x, s[:, :2]))
+
+
+def test_doa_bias_jacobian(geometry):
+    x, s, _ = geometry
+    x = np.array([x[0], x[1], 0.01])
+    expected = finite_difference(
+        lambda p: jacobians.model_and_jacobian_doa_bias(p, s[:, :2])[0],
+        x,
+        [1.0, 1.0, 1e-4],
+    )
+    np.testing.assert_allclose(
+        jacobians.model_and_jacobian_doa_bias(x, s[:, :2])[1],
+        expected,
+        rtol=1e-5,
+        atol=1e-12,
+    )
+
+
+def test_batched_candidates_match_single(geometry):
+    x, s, v = geometry
+    batch = x + np.array([[0.0, 0.0, 0.0], [1e3, 0.0, 0.0], [0.0, -2e3, 10.0]])
+    predicted, H = jacobians.model_and_jacobian_rr(batch, s, v)
+    assert predicted.shape == (3, s.shape[0]) and H.shape == (3, s.shape[0], 3)
+    for b in range(3):
+        np.testing.assert_allclose(H[b], jacobians.range_rate_jacobian(batch[b], s, v))
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from measurement_store import MeasurementStore, MeasurementStoreWriter
+
+
+def append_pass(writer, n=10):
+    t = np.arange(n, dtype=float)
+    writer.append(t, np.ones((n, 3)), np.zeros((n, 3)), t * 0.5, noise=0.05)
+
+
+def test_store_round_trips(tmp_path):
+    with MeasurementStoreWriter(tmp_path / "pass", index_stride=4) as writer:
+        append_pass(writer)
+    store = MeasurementStore(tmp_path / "pass")
+    assert len(store) == 10
+    np.testing.assert_array_equal(store.window(2.0, 5.0).measurement, [1.0, 1.5, 2.0])
+
+
+def test_exception_leaves_the_store_incomplete(tmp_path):
+    path = tmp_path / "pass"
+    with pytest.raises(RuntimeError):
+        with MeasurementStoreWriter(path) as writer:
+            append_pass(writer)
+            raise RuntimeError("source dropped")
+    with pytest.raises(FileNotFoundError):
+        MeasurementStore(path)
+    # the partial pass can be rewritten in place
+    with MeasurementStoreWriter(path) as writer:
+        append_pass(writer, n=3)
+    assert len(MeasurementStore(path)) == 3
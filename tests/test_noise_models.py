@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+import noise_models
+
+
+def test_solve_normal_equations_matches_lstsq():
+    rng = np.random.default_rng(0)
+    H = rng.normal(size=(50, 3))
+    r = rng.normal(size=(50, 1))
+    dx, P = noise_models.solve_normal_equations(H, r)
+    np.testing.assert_allclose(dx, np.linalg.lstsq(H, r, rcond=None)[0])
+    np.testing.assert_allclose(P, np.linalg.inv(H.T @ H))
+
+
+def test_float32_rows_accumulate_in_float64():
+    H = np.full((100_000, 3), 1 / 3, dtype=np.float32)
+    information, gradient = noise_models.normal_equations(H, np.ones((100_000, 1)))
+    assert information.dtype == np.float64
+    np.testing.assert_allclose(information, 100_000 * np.float64(H[0, 0]) ** 2, rtol=1e-12)
+    np.testing.assert_allclose(gradient, 100_000 * np.float64(H[0, 0]), rtol=1e-12)
+
+
+@pytest.mark.filterwarnings("ignore:invalid value:RuntimeWarning")
+@pytest.mark.parametrize("bad", [np.nan, np.inf])
+def test_non_finite_system_raises(bad):
+    H = np.eye(3)
+    r = np.array([[1.0], [bad], [0.0]])
+    with pytest.raises(ValueError, match="not finite"):
+        noise_models.solve_normal_equations(H, r)
+    H[1, 1] = bad
+    with pytest.raises(ValueError, match="not finite"):
+        noise_models.solve_normal_equations(H, np.ones((3, 1)))
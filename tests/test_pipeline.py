@@ -0,0 +1,39 @@
+import asyncio
+import numpy as np
+import pipeline
+
+
+def read_stream(data, **kwargs):
+    async def collect():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return [chunk async for chunk in pipeline.stream_source(reader, **kwargs)]
+
+    return asyncio.run(collect())
+
+
+def test_stream_source_keeps_last_line_without_newline():
+    data = b"0.0,1.5,0.05,1,2,3,4,5,6\n0.1,2.5,0.05,7,8,9,10,11,12"
+    chunks = read_stream(data)
+    chunk = pipeline.MeasurementChunk.concatenate(chunks)
+    np.testing.assert_allclose(chunk.time, [0.0, 0.1])
+    np.testing.assert_allclose(chunk.measurement, [1.5, 2.5])
+    np.testing.assert_allclose(chunk.sensor_state[0], [[1, 2, 3], [7, 8, 9]])
+    np.testing.assert_allclose(chunk.sensor_state[1], [[4, 5, 6], [10, 11, 12]])
+
+
+def test_stream_source_rows_split_across_reads():
+    data = b"".join(b"%d,%d,0.05,1,2,3,4,5,6\n" % (i, i) for i in range(100))
+    chunks = read_stream(data, read_size=7)
+    np.testing.assert_allclose(
+        pipeline.MeasurementChunk.concatenate(chunks).time, np.arange(100)
+    )
+
+
+def test_take_and_sort_before_ingest():
+    chunk = pipeline.MeasurementChunk([2.0, 1.0], [0.2, 0.1], 0.05, [np.eye(2)])
+    ordered = chunk.sorted()
+    assert ordered.received is None
+    np.testing.assert_allclose(ordered.measurement, [0.1, 0.2])
+    np.testing.assert_allclose(ordered.sensor_state[0], [[0, 1], [1, 0]])
@@ -0,0 +1,55 @@
+import numpy as np
+import ils
+import jacobians
+import model_equations
+from precision import MixedPrecisionModel
+from test_ils import range_rate_pass
+
+
+def solve(model_and_jacobian, x_naught, z, sigma, *sensor_state):
+    return ils.IteratedLeastSquares(
+        initial_parameters=x_naught[:, np.newaxis],
+        measurements=z[:, np.newaxis],
+        measurement_noise=np.array([sigma]),
+        tol=1e-3,
+        max_iterations=50,
+        model_and_jacobian=model_and_jacobian,
+    ).solve_ils(*sensor_state)
+
+
+def test_position_only_models_run_in_float32():
+    emitter, position, velocity, z = range_rate_pass(n=2000)
+    x_naught = emitter + np.array([300.0, -200.0, 0.0])
+    model = MixedPrecisionModel(
+        jacobians.model_and_jacobian_rr, x_naught, position, velocity
+    )
+    predicted, H = model(x_naught)
+    assert predicted.dtype == H.dtype == np.float32
+    reference = solve(
+        jacobians.model_and_jacobian_rr, x_naught, z, 0.05, position, velocity
+    )
+    result = solve(model, x_naught, z, 0.05)
+    assert reference.converged and result.converged
+    np.testing.assert_allclose(result.x_estimate, reference.x_estimate, atol=1e-2)
+
+
+def test_carrier_frequency_is_not_cast():
+    carrier = 9.4e9
+    emitter, position, velocity, _ = range_rate_pass(n=2000)
+    truth = np.append(emitter, carrier)
+    rng = np.random.default_rng(1)
+    z = model_equations.model_equation_foa(truth, position, velocity).reshape(-1)
+    z = z + rng.normal(0, 1.0, z.size)
+    x_naught = truth + np.array([300.0, -200.0, 0.0, 50.0])
+    model = MixedPrecisionModel(
+        jacobians.model_and_jacobian_foa, x_naught[:3], position, velocity
+    )
+    assert model.to_local(x_naught).dtype == np.float64
+    np.testing.assert_allclose(model.to_local(x_naught)[..., 3], carrier + 50.0)
+    reference = solve(
+        jacobians.model_and_jacobian_foa, x_naught, z, 1.0, position, velocity
+    )
+    result = solve(model, x_naught, z, 1.0)
+    assert reference.converged and result.converged
+    assert result.iterations <= reference.iterations + 1
+    np.testing.assert_allclose(result.x_estimate, reference.x_estimate, atol=1e-2)
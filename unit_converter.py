@@ -1,10 +1,21 @@
 import numpy as np
+import coordinate_transforms
 
 
 class UnitConverter:
     """
     A basic unit-conversion helper class.
     Supports scalar, list, and numpy array inputs.
+
+    Plain Python numbers take a scalar path that never creates a numpy array. Every
+    conversion also takes out=, a float array the result is written into (out may be value
+    itself to convert a column in place), so large columns are converted without a copy.
+
+    Example Input and output
+    UnitConverter.feet_to_meters(1000.0)
+    304.8
+    UnitConverter.feet_to_meters(altitude_ft, out=altitude_ft)  # in place
+    UnitConverter.geodetic_feet_to_ecef(lat_deg, lon_deg, altitude_ft)  [(N, 3)]
     """
 
     FEET_TO_METERS = 0.3048
@@ -17,42 +28,66 @@ class UnitConverter:
     RAD_TO_DEGREE = 1 / DEG_TO_RAD
 
     @staticmethod
-    def feet_to_meters(value):
-        arr_value = np.asarray(value, dtype=float)
-        converted = arr_value * UnitConverter.FEET_TO_METERS
-        return converted.item() if np.isscalar(value) else converted
+    def _scale(value, factor, out=None):
+        """value * factor, a float for scalar inputs, an array (or out) otherwise"""
+        if out is not None:
+            return np.multiply(value, factor, out=out)
+        if type(value) is float or type(value) is int:
+            return value * factor
+        if np.isscalar(value):
+            return float(value) * factor
+        return np.multiply(value, factor, dtype=float)
 
     @staticmethod
-    def meters_to_feet(value):
-        arr_value = np.asarray(value, dtype=float)
-        converted = arr_value * UnitConverter.METERS_TO_FEET
-
-        return converted.item() if np.isscalar(value) else converted
+    def feet_to_meters(value, out=None):
+        return UnitConverter._scale(value, UnitConverter.FEET_TO_METERS, out)
 
     @staticmethod
-    def nm_to_meters(value):
-        arr_value = np.asarray(value, dtype=float)
-        converted = arr_value * UnitConverter.NM_TO_METERS
-
-        return converted.item() if np.isscalar(value) else converted
+    def meters_to_feet(value, out=None):
+        return UnitConverter._scale(value, UnitConverter.METERS_TO_FEET, out)
 
     @staticmethod
-    def meters_to_nm(value):
-        arr_value = np.asarray(value, dtype=float)
-        converted = arr_value * UnitConverter.METERS_TO_NM
+    def nm_to_meters(value, out=None):
+        return UnitConverter._scale(value, UnitConverter.NM_TO_METERS, out)
 
-        return converted.item() if np.isscalar(value) else converted
+    @staticmethod
+    def meters_to_nm(value, out=None):
+        return UnitConverter._scale(value, UnitConverter.METERS_TO_NM, out)
 
     @staticmethod
-    def deg_to_rad(value):
-        arr_value = np.asarray(value, dtype=float)
-        converted = arr_value * UnitConverter.DEG_TO_RAD
+    def deg_to_rad(value, out=None):
+        return UnitConverter._scale(value, UnitConverter.DEG_TO_RAD, out)
 
-        return converted.item() if np.isscalar(value) else converted
+    @staticmethod
+    def rad_to_deg(value, out=None):
+        return UnitConverter._scale(value, UnitConverter.RAD_TO_DEGREE, out)
 
     @staticmethod
-    def rad_to_deg(value):
-        arr_value = np.asarray(value, dtype=float)
-        converted = arr_value * UnitConverter.RAD_TO_DEGREE
+    def geodetic_feet_to_ecef(latitude, longitude, altitude_feet, out=None):
+        """Latitude/longitude (degrees) and altitude (feet HAE) to (..., 3) ECEF metres
+
+        The altitude is converted into the z column of the output, which geodetic_to_ecef
+        then reads before overwriting it, so no metre copy of the altitude is made.
+        """
+        if out is None:
+            shape = np.broadcast_shapes(
+                np.shape(latitude), np.shape(longitude), np.shape(altitude_feet)
+            )
+            out = np.empty(shape + (3,))
+        altitude = UnitConverter.feet_to_meters(altitude_feet, out=out[..., 2])
+        return coordinate_transforms.geodetic_to_ecef(
+            latitude, longitude, altitude, out=out
+        )
 
-        return converted.item() if np.isscalar(value) else converted
+    @staticmethod
+    def geodetic_nm_to_ecef(latitude, longitude, altitude_nm, out=None):
+        """Latitude/longitude (degrees) and altitude (nautical miles HAE) to (..., 3) ECEF metres"""
+        if out is None:
+            shape = np.broadcast_shapes(
+                np.shape(latitude), np.shape(longitude), np.shape(altitude_nm)
+            )
+            out = np.empty(shape + (3,))
+        altitude = UnitConverter.nm_to_meters(altitude_nm, out=out[..., 2])
+        return coordinate_transforms.geodetic_to_ecef(
+            latitude, longitude, altitude, out=out
+        )